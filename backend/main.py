@@ -1,13 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from bson.errors import InvalidId
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import base64
+import json
 import os
 from dotenv import load_dotenv
 
 # 導入 PostgreSQL 相關模組
-from postgres import postgres_router, close_postgres_connection
+from postgres import (
+    postgres_router,
+    metrics_router,
+    MetricsMiddleware,
+    close_postgres_connection,
+    close_query_sessions,
+    init_postgres_pool,
+    init_industry_index,
+    init_industry_rollups,
+    stop_industry_rollups,
+    init_stock_search_index
+)
 
 load_dotenv()
 
@@ -20,15 +39,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # MongoDB 連接
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://mongodb:27017")
-client = AsyncIOMotorClient(MONGODB_URL)
+client = AsyncIOMotorClient(MONGODB_URL, tz_aware=True)
 db = client.testdb
 
+# 分頁大小預設值與上限，以及 motor 游標每次向伺服器取回的文件數
+MONGO_PAGE_SIZE = int(os.getenv("MONGO_PAGE_SIZE", "100"))
+MONGO_MAX_PAGE_SIZE = int(os.getenv("MONGO_MAX_PAGE_SIZE", "1000"))
+MONGO_CURSOR_BATCH_SIZE = int(os.getenv("MONGO_CURSOR_BATCH_SIZE", "500"))
+
+# 批次寫入單次請求的文件數上限
+MONGO_BULK_MAX_DOCUMENTS = int(os.getenv("MONGO_BULK_MAX_DOCUMENTS", "10000"))
+
+# 記錄每個路由的延遲與回應大小
+app.add_middleware(MetricsMiddleware)
+
 # 註冊路由
 app.include_router(postgres_router)
+app.include_router(metrics_router)
 
 # Pydantic 模型
 class Item(BaseModel):
@@ -47,7 +79,7 @@ class TestMessage(BaseModel):
 
 class TestMessageResponse(TestMessage):
     id: str
-    created_at: str
+    created_at: datetime
 
 # 數據庫操作
 async def get_collection():
@@ -56,14 +88,147 @@ async def get_collection():
 async def get_test_messages_collection():
     return db.test_messages
 
+# test_messages 的複合索引：等值條件在前、created_at 範圍 / 排序在後，_id 用於分頁時的同值排序
+TEST_MESSAGE_INDEXES = [
+    [("category", ASCENDING), ("priority", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("priority", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("created_at", DESCENDING), ("_id", DESCENDING)],
+]
+
+async def ensure_test_message_indexes():
+    """建立 test_messages 索引，並將舊版以 ISO 字串儲存的 created_at 轉為 BSON datetime"""
+    collection = await get_test_messages_collection()
+    try:
+        result = await collection.update_many(
+            {"created_at": {"$type": "string"}},
+            [{"$set": {"created_at": {"$toDate": "$created_at"}}}]
+        )
+        if result.modified_count:
+            print(f"✅ 已轉換 {result.modified_count} 筆 test_messages 的 created_at 為 datetime")
+    except Exception as e:
+        # 轉換失敗（例如含無法解析的字串）不影響索引建立
+        print(f"❌ 轉換 test_messages 的 created_at 失敗: {e}")
+    
+    try:
+        for keys in TEST_MESSAGE_INDEXES:
+            await collection.create_index(keys)
+        print("✅ test_messages 索引已建立")
+    except Exception as e:
+        print(f"❌ 建立 test_messages 索引失敗: {e}")
+
+# 讀取輔助函數
+def parse_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """將逗號分隔的欄位名稱轉為 projection，_id 一律保留以產生分頁游標"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    for name in names:
+        if name.startswith("$"):
+            raise HTTPException(status_code=400, detail=f"無效的欄位名稱: {name}")
+    return {name: 1 for name in names}
+
+def parse_object_id(value: str) -> ObjectId:
+    """解析 ObjectId，格式錯誤時返回 400"""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=f"無效的 ID: {value}")
+
+def encode_time_cursor(created_at: Optional[datetime], object_id: ObjectId) -> str:
+    """將最後一筆的 (created_at, _id) 編碼為不透明的分頁游標，缺少 created_at 時只以 _id 定位"""
+    raw = f"{created_at.isoformat() if created_at is not None else ''}|{object_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_time_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    """解碼 (created_at, _id) 分頁游標"""
+    try:
+        created_at, object_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(created_at) if created_at else None), ObjectId(object_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="無效的分頁游標")
+
+def page_size(limit: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """
+    JSON 模式的每頁筆數：未指定 limit 與 cursor 時維持舊版行為返回全部文件（None），
+    否則預設 MONGO_PAGE_SIZE 並以 MONGO_MAX_PAGE_SIZE 為上限
+    """
+    if limit is None and cursor is None:
+        return None
+    return min(limit or MONGO_PAGE_SIZE, MONGO_MAX_PAGE_SIZE)
+
+def serialize_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """將 _id 轉為字串 id，不建立 Pydantic 模型"""
+    document["id"] = str(document.pop("_id"))
+    return document
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"無法序列化的類型: {type(value).__name__}")
+
+async def stream_ndjson(cursor):
+    """逐筆將游標中的文件輸出為 NDJSON，記憶體用量只與 batch_size 相關"""
+    async for document in cursor:
+        yield (json.dumps(serialize_document(document), default=_json_default, ensure_ascii=False) + "\n").encode()
+
+async def bulk_insert(collection, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    以 insert_many(ordered=False) 寫入，不重新讀取文件
+    _id 由驅動程式在送出前寫入每個文件，因此回應可直接由輸入組成；
+    部分失敗時依 BulkWriteError 的 writeErrors 排除失敗的文件並返回錯誤明細
+    """
+    if not documents:
+        return [], []
+    if len(documents) > MONGO_BULK_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"單次最多寫入 {MONGO_BULK_MAX_DOCUMENTS} 筆文件")
+    
+    errors = []
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = [
+            {"index": error["index"], "code": error.get("code"), "message": error.get("errmsg")}
+            for error in e.details.get("writeErrors", [])
+        ]
+    
+    failed = {error["index"] for error in errors}
+    inserted = [serialize_document(document) for index, document in enumerate(documents) if index not in failed]
+    return inserted, errors
+
+async def read_page(cursor, limit: Optional[int], response: Response, next_cursor) -> List[Dict[str, Any]]:
+    """
+    讀取一頁文件，多取一筆判斷是否還有下一頁
+    有下一頁時以 X-Next-Cursor 回應標頭返回游標，回應內容維持陣列格式；limit 為 None 時返回全部文件
+    """
+    if limit is None:
+        return [serialize_document(document) async for document in cursor]
+    documents = await cursor.limit(limit + 1).to_list(length=limit + 1)
+    if len(documents) > limit:
+        documents = documents[:limit]
+        response.headers["X-Next-Cursor"] = next_cursor(documents[-1])
+    return [serialize_document(document) for document in documents]
+
 @app.on_event("startup")
 async def startup_db_client():
     print("Connected to MongoDB!")
+    await ensure_test_message_indexes()
+    # 創建並預熱 PostgreSQL 連接池
+    await init_postgres_pool()
+    # 載入 PostgreSQL 產業對照索引
+    await init_industry_index()
+    # 建立產業每日彙總表，需要整批回填時於背景執行
+    await init_industry_rollups()
+    # 建立股票搜尋索引
+    await init_stock_search_index()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
-    # 關閉 PostgreSQL 連接池
+    # 停止背景回填並歸還查詢游標工作階段持有的連接後關閉 PostgreSQL 連接池
+    await stop_industry_rollups()
+    await close_query_sessions()
     await close_postgres_connection()
 
 @app.get("/")
@@ -80,33 +245,104 @@ async def hello_world():
 
 @app.post("/test-messages/", response_model=TestMessageResponse)
 async def create_test_message(message: TestMessage):
-    from datetime import datetime
     collection = await get_test_messages_collection()
     
     # 添加創建時間
     message_data = message.dict()
-    message_data["created_at"] = datetime.now().isoformat()
+    message_data["created_at"] = datetime.now(timezone.utc)
     
     result = await collection.insert_one(message_data)
-    created_message = await collection.find_one({"_id": result.inserted_id})
-    created_message["id"] = str(created_message["_id"])
-    del created_message["_id"]
-    return TestMessageResponse(**created_message)
+    message_data["id"] = str(result.inserted_id)
+    del message_data["_id"]
+    return TestMessageResponse(**message_data)
 
-@app.get("/test-messages/", response_model=List[TestMessageResponse])
-async def read_test_messages():
+@app.post("/test-messages/bulk")
+async def create_test_messages_bulk(messages: List[TestMessage]):
+    """批次創建測試消息，部分失敗時返回成功寫入的消息與錯誤明細"""
     collection = await get_test_messages_collection()
-    messages = []
-    async for message in collection.find():
-        message["id"] = str(message["_id"])
-        del message["_id"]
-        messages.append(TestMessageResponse(**message))
-    return messages
+    
+    created_at = datetime.now(timezone.utc)
+    documents = [{**message.dict(), "created_at": created_at} for message in messages]
+    inserted, errors = await bulk_insert(collection, documents)
+    
+    return {
+        "success": not errors,
+        "message": f"成功寫入 {len(inserted)} 筆測試消息" + (f"，{len(errors)} 筆失敗" if errors else ""),
+        "inserted_count": len(inserted),
+        "data": inserted,
+        "errors": errors
+    }
+
+@app.get("/test-messages/")
+async def read_test_messages(
+    response: Response,
+    category: Optional[str] = None,
+    priority: Optional[str] = None,
+    created_after: Optional[datetime] = Query(None, description="created_at 下限（包含）"),
+    created_before: Optional[datetime] = Query(None, description="created_at 上限（不包含）"),
+    sort: str = Query("desc", pattern="^(asc|desc)$", description="依 created_at 排序方向"),
+    limit: Optional[int] = Query(None, ge=1, description="每頁筆數，未指定 limit 與 cursor 時返回全部"),
+    cursor: Optional[str] = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值"),
+    fields: Optional[str] = Query(None, description="逗號分隔的返回欄位"),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """依分類、優先級與建立時間範圍查詢測試消息，以 (created_at, _id) 游標分頁"""
+    collection = await get_test_messages_collection()
+    
+    conditions = []
+    if category is not None:
+        conditions.append({"category": category})
+    if priority is not None:
+        conditions.append({"priority": priority})
+    if created_after is not None:
+        conditions.append({"created_at": {"$gte": created_after}})
+    if created_before is not None:
+        conditions.append({"created_at": {"$lt": created_before}})
+    
+    operator = "$gt" if sort == "asc" else "$lt"
+    if cursor is not None:
+        last_created_at, last_id = decode_time_cursor(cursor)
+        # 缺少 created_at 的文件在遞增排序時排在最前、遞減排序時排在最後
+        if last_created_at is None:
+            after = [{"created_at": None, "_id": {operator: last_id}}]
+            if sort == "asc":
+                after.append({"created_at": {"$ne": None}})
+        else:
+            after = [
+                {"created_at": {operator: last_created_at}},
+                {"created_at": last_created_at, "_id": {operator: last_id}}
+            ]
+            if sort == "desc":
+                after.append({"created_at": None})
+        conditions.append({"$or": after})
+    
+    query = {"$and": conditions} if conditions else {}
+    projection = parse_projection(fields)
+    if projection is not None:
+        projection["created_at"] = 1
+    
+    direction = ASCENDING if sort == "asc" else DESCENDING
+    mongo_cursor = (
+        collection.find(query, projection)
+        .sort([("created_at", direction), ("_id", direction)])
+        .batch_size(MONGO_CURSOR_BATCH_SIZE)
+    )
+    
+    if format == "ndjson":
+        if limit is not None:
+            mongo_cursor = mongo_cursor.limit(limit)
+        return StreamingResponse(stream_ndjson(mongo_cursor), media_type="application/x-ndjson")
+    
+    return await read_page(
+        mongo_cursor,
+        page_size(limit, cursor),
+        response,
+        lambda document: encode_time_cursor(document.get("created_at"), document["_id"])
+    )
 
 @app.post("/test-messages/sample")
 async def create_sample_test_message():
     """創建一個示例測試消息"""
-    from datetime import datetime
     collection = await get_test_messages_collection()
     
     sample_message = {
@@ -114,43 +350,79 @@ async def create_sample_test_message():
         "content": "這是一個從 FastAPI 後端寫入 MongoDB 的測試消息",
         "category": "test",
         "priority": "high",
-        "created_at": datetime.now().isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     result = await collection.insert_one(sample_message)
-    created_message = await collection.find_one({"_id": result.inserted_id})
-    created_message["id"] = str(created_message["_id"])
-    del created_message["_id"]
+    sample_message["id"] = str(result.inserted_id)
+    del sample_message["_id"]
     
     return {
         "message": "示例測試消息已成功寫入 MongoDB",
-        "data": TestMessageResponse(**created_message)
+        "data": TestMessageResponse(**sample_message)
     }
 
 @app.post("/items/", response_model=ItemResponse)
 async def create_item(item: Item):
     collection = await get_collection()
-    result = await collection.insert_one(item.dict())
-    created_item = await collection.find_one({"_id": result.inserted_id})
-    created_item["id"] = str(created_item["_id"])
-    del created_item["_id"]
-    return ItemResponse(**created_item)
-
-@app.get("/items/", response_model=List[ItemResponse])
-async def read_items():
+    item_data = item.dict()
+    result = await collection.insert_one(item_data)
+    item_data["id"] = str(result.inserted_id)
+    del item_data["_id"]
+    return ItemResponse(**item_data)
+
+@app.post("/items/bulk")
+async def create_items_bulk(items: List[Item]):
+    """批次創建項目，部分失敗時返回成功寫入的項目與錯誤明細"""
     collection = await get_collection()
-    items = []
-    async for item in collection.find():
-        item["id"] = str(item["_id"])
-        del item["_id"]
-        items.append(ItemResponse(**item))
-    return items
+    
+    inserted, errors = await bulk_insert(collection, [item.dict() for item in items])
+    
+    return {
+        "success": not errors,
+        "message": f"成功寫入 {len(inserted)} 個項目" + (f"，{len(errors)} 個失敗" if errors else ""),
+        "inserted_count": len(inserted),
+        "data": inserted,
+        "errors": errors
+    }
+
+@app.get("/items/")
+async def read_items(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="每頁筆數，未指定 limit 與 cursor 時返回全部"),
+    cursor: Optional[str] = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值"),
+    fields: Optional[str] = Query(None, description="逗號分隔的返回欄位"),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """依 _id 升序分頁讀取項目"""
+    collection = await get_collection()
+    
+    query = {}
+    if cursor is not None:
+        query["_id"] = {"$gt": parse_object_id(cursor)}
+    
+    mongo_cursor = (
+        collection.find(query, parse_projection(fields))
+        .sort("_id", ASCENDING)
+        .batch_size(MONGO_CURSOR_BATCH_SIZE)
+    )
+    
+    if format == "ndjson":
+        if limit is not None:
+            mongo_cursor = mongo_cursor.limit(limit)
+        return StreamingResponse(stream_ndjson(mongo_cursor), media_type="application/x-ndjson")
+    
+    return await read_page(
+        mongo_cursor,
+        page_size(limit, cursor),
+        response,
+        lambda document: str(document["_id"])
+    )
 
 @app.get("/items/{item_id}", response_model=ItemResponse)
 async def read_item(item_id: str):
-    from bson import ObjectId
     collection = await get_collection()
-    item = await collection.find_one({"_id": ObjectId(item_id)})
+    item = await collection.find_one({"_id": parse_object_id(item_id)})
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     item["id"] = str(item["_id"])
@@ -159,9 +431,8 @@ async def read_item(item_id: str):
 
 @app.delete("/items/{item_id}")
 async def delete_item(item_id: str):
-    from bson import ObjectId
     collection = await get_collection()
-    result = await collection.delete_one({"_id": ObjectId(item_id)})
+    result = await collection.delete_one({"_id": parse_object_id(item_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
     return {"message": "Item deleted successfully"}
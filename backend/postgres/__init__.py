@@ -3,12 +3,25 @@ PostgreSQL 相關模組
 包含連接、模型、路由等 PostgreSQL 相關功能
 """
 
-from .connection import get_postgres_connection, close_postgres_connection
+from .connection import get_postgres_connection, close_postgres_connection, init_postgres_pool
 from .models import *
+from .industry import init_industry_index
+from .rollup import init_industry_rollups, stop_industry_rollups
+from .search import init_stock_search_index
+from .query_session import close_query_sessions
 from .routers import postgres_router
+from .metrics import MetricsMiddleware, metrics_router
 
 __all__ = [
     "get_postgres_connection",
     "close_postgres_connection", 
-    "postgres_router"
+    "init_postgres_pool",
+    "init_industry_index",
+    "init_industry_rollups",
+    "stop_industry_rollups",
+    "init_stock_search_index",
+    "close_query_sessions",
+    "postgres_router",
+    "MetricsMiddleware",
+    "metrics_router"
 ]
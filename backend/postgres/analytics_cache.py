@@ -0,0 +1,124 @@
+"""
+產業分析回應快取模組
+以解析後的交易日期作為快取鍵，所有結果共用同一個有位元組預算的 LRU：歷史日期的結果不會再變動，
+最新交易日的結果另外記錄其鍵，在出現更新的 trade_date 時整批失效
+"""
+
+import os
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+from .cache import TTLCache, LRUByteCache
+from .connection import acquire_connection
+from .industry import get_industry_map_version
+from .responses import dumps
+
+load_dotenv()
+
+# 歷史日期快取的位元組上限與最新交易日期的檢查間隔秒數
+ANALYTICS_CACHE_MAX_BYTES = int(os.getenv("POSTGRES_ANALYTICS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TRADE_DATE_CHECK_TTL = float(os.getenv("POSTGRES_TRADE_DATE_CHECK_TTL", "30"))
+
+# 各來源資料表的最新交易日期
+LATEST_TRADE_DATES_QUERY = """
+    SELECT
+        (SELECT MAX(trade_date) FROM tw_stock_price) as tw_stock_price,
+        (SELECT MAX(trade_date) FROM twse_stock_insti) as twse_stock_insti,
+        (SELECT MAX(trade_date) FROM tpex_stock_insti) as tpex_stock_insti
+"""
+
+_latest_dates_cache = TTLCache(ttl=TRADE_DATE_CHECK_TTL, maxsize=1)
+
+async def get_latest_trade_dates() -> Dict[str, Any]:
+    """獲取各資料表的最新交易日期，結果短暫快取"""
+    latest = _latest_dates_cache.get("latest")
+    if latest is None:
+        async with acquire_connection() as conn:
+            row = await conn.fetchrow(LATEST_TRADE_DATES_QUERY)
+        latest = dict(row)
+        _latest_dates_cache.set("latest", latest)
+    return latest
+
+class CacheKey:
+    """快取查詢結果，記錄寫入時需要的鍵與所屬區域"""
+
+    def __init__(self, key: Hashable, is_latest: bool, signature: Tuple):
+        self.key = key
+        self.is_latest = is_latest
+        self.signature = signature
+
+class TradeDateResponseCache:
+    """以解析後交易日期為鍵的回應快取"""
+
+    def __init__(self, max_bytes: int):
+        self._data = LRUByteCache(max_bytes)
+        # 最新交易日區域的鍵，已被 LRU 淘汰的鍵在寫入時順便清除
+        self._latest: Set[Hashable] = set()
+        self._latest_signature: Optional[Tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def lookup(self, route: str, params: Tuple, date_param, tables: Tuple[str, ...]) -> Tuple[Optional[Any], CacheKey]:
+        """
+        查詢快取
+        tables 為該路由依賴的資料表，用來解析未指定日期時實際查詢的交易日
+        """
+        latest = await get_latest_trade_dates()
+        map_version = get_industry_map_version()
+        signature = (tuple(sorted(latest.items())), map_version)
+
+        # 最新交易日期或產業對照前進時，最新日期的快取整批失效
+        if signature != self._latest_signature:
+            for key in self._latest:
+                if self._data.pop(key) is not None:
+                    self.invalidations += 1
+            self._latest.clear()
+            self._latest_signature = signature
+
+        resolved = tuple(date_param or latest[table] for table in tables)
+        is_latest = any(
+            latest[table] is None or resolved_date is None or resolved_date >= latest[table]
+            for table, resolved_date in zip(tables, resolved)
+        )
+        key = (route, params, resolved, map_version)
+
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value, CacheKey(key, is_latest, signature)
+
+    def store(self, cache_key: CacheKey, value: Any):
+        """寫入快取，期間最新交易日期已變動時不寫入最新日期區域"""
+        if cache_key.is_latest:
+            if cache_key.signature != self._latest_signature:
+                return
+            self._latest.add(cache_key.key)
+            if len(self._latest) > 2 * len(self._data) + 16:
+                self._latest = {key for key in self._latest if key in self._data}
+        size = len(dumps(value))
+        self._data.set(cache_key.key, value, size)
+
+    def clear(self):
+        """清空所有快取"""
+        self._data.clear()
+        self._latest.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回快取命中統計"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._data),
+            "bytes": self._data.current_bytes,
+            "max_bytes": self._data.max_bytes,
+            "evictions": self._data.evictions,
+            "latest_entries": sum(1 for key in self._latest if key in self._data),
+            "latest_invalidations": self.invalidations
+        }
+
+analytics_cache = TradeDateResponseCache(ANALYTICS_CACHE_MAX_BYTES)
@@ -0,0 +1,174 @@
+"""
+批次寫入模組
+無衝突處理時以 COPY 寫入，指定衝突欄位時以 UNNEST 陣列組成單一 INSERT ... ON CONFLICT 語句
+所有值以文字傳送，由 PostgreSQL 依欄位型別解析，因此 JSON 中的日期、數字字串都能直接寫入
+"""
+
+import io
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import quote_ident
+
+# 取得資料表各欄位的完整型別（含長度、精度）
+TABLE_COLUMN_TYPES_QUERY = """
+    SELECT a.attname as column_name, format_type(a.atttypid, a.atttypmod) as column_type
+    FROM pg_attribute a
+    WHERE a.attrelid = $1::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+"""
+
+def _to_text(value: Any) -> Optional[str]:
+    """將 JSON 值轉為 PostgreSQL 可解析的文字"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def normalize_records(
+    records: Optional[List[Dict[str, Any]]],
+    columns: Optional[Dict[str, List[Any]]]
+) -> Tuple[List[str], List[List[Optional[str]]]]:
+    """
+    將 records（列式）或 columns（欄式）轉為欄位名稱與文字列
+    records 中缺少的欄位視為 NULL
+    """
+    if columns is not None:
+        names = list(columns.keys())
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("columns 中每個欄位的陣列長度必須相同")
+        rows = [list(row) for row in zip(*columns.values())]
+    else:
+        names = []
+        for record in records or []:
+            for name in record:
+                if name not in names:
+                    names.append(name)
+        rows = [[record.get(name) for name in names] for record in records or []]
+
+    return names, [[_to_text(value) for value in row] for row in rows]
+
+def _csv_field(value: Optional[str]) -> str:
+    """CSV 欄位：非 NULL 一律加引號，NULL 以未加引號的空字串表示"""
+    if value is None:
+        return ""
+    return '"' + value.replace('"', '""') + '"'
+
+def build_csv(rows: List[List[Optional[str]]]) -> bytes:
+    """將文字列組成 COPY 可讀取的 CSV"""
+    return "".join(",".join(_csv_field(value) for value in row) + "\n" for row in rows).encode()
+
+async def fetch_column_types(conn, schema_name: str, table_name: str) -> Dict[str, str]:
+    """獲取資料表欄位型別"""
+    rows = await conn.fetch(TABLE_COLUMN_TYPES_QUERY, f"{quote_ident(schema_name)}.{quote_ident(table_name)}")
+    return {row['column_name']: row['column_type'] for row in rows}
+
+def build_upsert_sql(
+    schema_name: str,
+    table_name: str,
+    columns: List[str],
+    column_types: Dict[str, str],
+    conflict_columns: List[str],
+    update_columns: Optional[List[str]]
+) -> str:
+    """
+    以 UNNEST 文字陣列組成 INSERT ... ON CONFLICT 語句
+    update_columns 必須是寫入的欄位之一，否則 EXCLUDED 中的值為 NULL 或預設值，會覆蓋既有資料
+    """
+    unknown = [name for name in columns + conflict_columns + (update_columns or []) if name not in column_types]
+    if unknown:
+        raise ValueError(f"資料表 {table_name} 不存在欄位: {', '.join(unknown)}")
+    missing = [name for name in update_columns or [] if name not in columns]
+    if missing:
+        raise ValueError(f"update_columns 中的欄位未包含在寫入的數據中: {', '.join(missing)}")
+
+    if update_columns is None:
+        update_columns = [name for name in columns if name not in conflict_columns]
+
+    quoted = [quote_ident(name) for name in columns]
+    arrays = ", ".join(f"${i + 1}::text[]" for i in range(len(columns)))
+    casts = ", ".join(f"{quote_ident(name)}::{column_types[name]}" for name in columns)
+
+    sql = f"""
+        INSERT INTO {quote_ident(schema_name)}.{quote_ident(table_name)} ({', '.join(quoted)})
+        SELECT {casts}
+        FROM UNNEST({arrays}) AS t({', '.join(quoted)})
+        ON CONFLICT ({', '.join(quote_ident(name) for name in conflict_columns)})
+    """
+    if update_columns:
+        assignments = ", ".join(f"{quote_ident(name)} = EXCLUDED.{quote_ident(name)}" for name in update_columns)
+        sql += f" DO UPDATE SET {assignments}"
+    else:
+        sql += " DO NOTHING"
+    return sql
+
+def check_duplicate_keys(columns: List[str], rows: List[List[Optional[str]]], conflict_columns: List[str], batch_size: int):
+    """
+    同一批中重複的衝突鍵會使 ON CONFLICT DO UPDATE 失敗，寫入前逐批檢查並拋出 ValueError
+    含 NULL 的鍵不會觸發衝突，不列入檢查；衝突欄位不在寫入欄位中時無法檢查
+    """
+    if any(name not in columns for name in conflict_columns):
+        return
+    indexes = [columns.index(name) for name in conflict_columns]
+    for start in range(0, len(rows), batch_size):
+        seen = set()
+        for offset, row in enumerate(rows[start:start + batch_size]):
+            key = tuple(row[index] for index in indexes)
+            if None in key:
+                continue
+            if key in seen:
+                raise ValueError(
+                    f"第 {start + offset} 行的衝突鍵 ({', '.join(conflict_columns)}) = ({', '.join(key)}) "
+                    f"與同一批中的其他行重複，請先合併重複的行"
+                )
+            seen.add(key)
+
+def _status_count(status: str) -> int:
+    """從 'INSERT 0 10'、'COPY 10' 等狀態字串取得影響行數"""
+    try:
+        return int(status.split()[-1])
+    except (ValueError, IndexError):
+        return 0
+
+async def write_batches(
+    conn,
+    schema_name: str,
+    table_name: str,
+    columns: List[str],
+    rows: List[List[Optional[str]]],
+    batch_size: int,
+    conflict_columns: Optional[List[str]] = None,
+    update_columns: Optional[List[str]] = None
+) -> List[Dict[str, int]]:
+    """
+    在單一交易中分批寫入，返回每批的輸入行數與實際寫入行數
+    任一批失敗時整個交易回滾
+    """
+    results = []
+    async with conn.transaction():
+        upsert_sql = None
+        if conflict_columns:
+            column_types = await fetch_column_types(conn, schema_name, table_name)
+            upsert_sql = build_upsert_sql(schema_name, table_name, columns, column_types, conflict_columns, update_columns)
+            check_duplicate_keys(columns, rows, conflict_columns, batch_size)
+
+        for index, start in enumerate(range(0, len(rows), batch_size)):
+            chunk = rows[start:start + batch_size]
+            if upsert_sql is not None:
+                column_arrays = [list(values) for values in zip(*chunk)]
+                status = await conn.execute(upsert_sql, *column_arrays)
+            else:
+                status = await conn.copy_to_table(
+                    table_name,
+                    source=io.BytesIO(build_csv(chunk)),
+                    columns=columns,
+                    schema_name=schema_name,
+                    format="csv"
+                )
+            results.append({"batch": index, "rows": len(chunk), "written": _status_count(status)})
+    return results
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+批次寫入效能比較腳本
+通過後端 API 比較逐筆插入與批次插入 / upsert 的耗時
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import requests
+
+BASE_URL = "http://localhost:8000/postgres"
+# 自定義查詢端點只允許 SELECT，無法 DROP TABLE，每次執行改用帶時間戳的新資料表
+TABLE_NAME = f"insert_benchmark_{int(time.time())}"
+
+def check_response(response, action: str):
+    """非 2xx 回應時以後端的錯誤訊息中止"""
+    if not response.ok:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise RuntimeError(f"{action}失敗 (HTTP {response.status_code}): {detail}")
+    return response
+
+def build_records(count: int):
+    """產生測試數據"""
+    return [
+        {
+            "id": i,
+            "stock_id": f"{random.randint(1000, 9999)}",
+            "close": round(random.uniform(10, 1000), 2),
+            "shares": random.randint(1, 10_000_000),
+        }
+        for i in range(count)
+    ]
+
+def create_table():
+    """建立本次執行的測試資料表"""
+    response = requests.post(
+        f"{BASE_URL}/tables/create",
+        json={
+            "table_name": TABLE_NAME,
+            "columns": [
+                {"name": "id", "type": "INTEGER PRIMARY KEY"},
+                {"name": "stock_id", "type": "VARCHAR(10)"},
+                {"name": "close", "type": "NUMERIC(10, 2)"},
+                {"name": "shares", "type": "BIGINT"},
+            ],
+        },
+        timeout=10,
+    )
+    check_response(response, "建立測試資料表")
+
+def clear_table():
+    """以刪除端點清空測試資料表"""
+    response = requests.delete(
+        f"{BASE_URL}/tables/{TABLE_NAME}/delete",
+        json={"table_name": TABLE_NAME, "where_clause": "TRUE"},
+        timeout=60,
+    )
+    check_response(response, "清空測試資料表")
+
+def bench_single(records):
+    """逐筆呼叫 insert 端點"""
+    start_time = time.time()
+    for record in records:
+        response = requests.post(
+            f"{BASE_URL}/tables/{TABLE_NAME}/insert",
+            json={"table_name": TABLE_NAME, "data": record},
+            timeout=10,
+        )
+        check_response(response, "逐筆插入")
+    return time.time() - start_time
+
+def bench_batch(records, batch_size: int, upsert: bool):
+    """呼叫批次端點，upsert 時以 id 作為衝突欄位"""
+    payload = {"records": records, "batch_size": batch_size}
+    if upsert:
+        payload["conflict_columns"] = ["id"]
+    start_time = time.time()
+    response = requests.post(f"{BASE_URL}/tables/{TABLE_NAME}/insert/batch", json=payload, timeout=300)
+    check_response(response, "批次 upsert" if upsert else "批次插入")
+    return time.time() - start_time, response.json()
+
+def main():
+    parser = argparse.ArgumentParser(description="比較逐筆插入與批次插入的耗時")
+    parser.add_argument("--rows", type=int, default=1000, help="逐筆插入的行數")
+    parser.add_argument("--batch-rows", type=int, default=100000, help="批次插入的行數")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每批行數")
+    args = parser.parse_args()
+
+    try:
+        print(f"=== 批次寫入效能比較 ({TABLE_NAME}) ===")
+
+        create_table()
+        elapsed = bench_single(build_records(args.rows))
+        print(f"逐筆插入: {args.rows} 行，{elapsed:.2f} 秒，{args.rows / elapsed:,.0f} 行/秒")
+
+        clear_table()
+        records = build_records(args.batch_rows)
+        elapsed, result = bench_batch(records, args.batch_size, upsert=False)
+        print(f"批次插入 (COPY): {result['written_count']} 行，{elapsed:.2f} 秒，{args.batch_rows / elapsed:,.0f} 行/秒")
+
+        elapsed, result = bench_batch(records, args.batch_size, upsert=True)
+        print(f"批次 upsert (UNNEST): {result['written_count']} 行，{elapsed:.2f} 秒，{args.batch_rows / elapsed:,.0f} 行/秒")
+
+        print(f"\n✅ 比較完成！測試資料表 {TABLE_NAME} 可自行刪除")
+    except requests.exceptions.ConnectionError:
+        print("❌ 無法連接到後端服務 (http://localhost:8000)")
+        print("請先啟動後端服務: docker-compose up -d")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ 發生錯誤: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+PostgreSQL 查詢結果快取工具
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class TTLCache:
+    """
+    帶有存活時間的簡易快取
+    超過 maxsize 時淘汰最久未使用的項目
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """取得快取值，過期或不存在時返回 None"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """寫入快取值"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """清空快取"""
+        self._data.clear()
+
+class LRUByteCache:
+    """
+    以位元組預算限制大小的 LRU 快取
+    每個項目的大小由呼叫端提供，總量超過 max_bytes 時淘汰最久未使用的項目
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """取得快取值，不存在時返回 None"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, size: int):
+        """寫入快取值，單一項目超過預算時不快取"""
+        if size > self.max_bytes:
+            return
+        self.pop(key)
+        self._data[key] = (size, value)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (evicted_size, _) = self._data.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """移除並返回快取值"""
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        self.current_bytes -= entry[0]
+        return entry[1]
+
+    def clear(self):
+        """清空快取"""
+        self._data.clear()
+        self.current_bytes = 0
@@ -0,0 +1,168 @@
+"""
+股票K線圖數據處理模組
+包含 K 線重採樣 SQL 與 LTTB 降採樣
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+
+from .statements import register_statement
+
+load_dotenv()
+
+# 多股票K線批次查詢單次請求的股票數上限
+CHART_BATCH_MAX_IDS = int(os.getenv("POSTGRES_CHART_BATCH_MAX_IDS", "100"))
+
+# K 線週期對應 PostgreSQL date_trunc 的單位
+CHART_INTERVALS = {
+    "day": None,
+    "week": "week",
+    "month": "month",
+}
+
+# 日K查詢：依 trade_date 由新到舊，支援日期範圍與 keyset 分頁
+DAILY_CHART_QUERY = register_statement("stock_chart_daily", """
+    SELECT trade_date, open, close, high, low, shares
+    FROM tw_stock_price
+    WHERE stock_id = $1
+    AND trade_date >= COALESCE($2::date, '-infinity'::date)
+    AND trade_date <= COALESCE($3::date, 'infinity'::date)
+    AND trade_date < COALESCE($4::date, 'infinity'::date)
+    ORDER BY trade_date DESC
+    LIMIT $5
+""")
+
+# 週K / 月K 查詢：在資料庫端彙總，trade_date 為該週期的第一個交易日
+RESAMPLED_CHART_QUERY = register_statement("stock_chart_resampled", """
+    SELECT
+        MIN(trade_date) as trade_date,
+        (ARRAY_AGG(open ORDER BY trade_date))[1] as open,
+        (ARRAY_AGG(close ORDER BY trade_date DESC))[1] as close,
+        MAX(high) as high,
+        MIN(low) as low,
+        SUM(shares) as shares
+    FROM tw_stock_price
+    WHERE stock_id = $1
+    AND trade_date >= COALESCE($2::date, '-infinity'::date)
+    AND trade_date <= COALESCE($3::date, 'infinity'::date)
+    AND trade_date < COALESCE($4::date, 'infinity'::date)
+    GROUP BY date_trunc($6::text, trade_date)
+    ORDER BY MIN(trade_date) DESC
+    LIMIT $5
+""")
+
+# 多股票日K查詢：以 LATERAL 對每檔股票各自走 (stock_id, trade_date) 索引，每檔最多取 $4 筆
+BATCH_DAILY_CHART_QUERY = register_statement("stock_chart_batch_daily", """
+    SELECT ids.stock_id, c.trade_date, c.open, c.close, c.high, c.low, c.shares
+    FROM unnest($1::text[]) AS ids(stock_id)
+    CROSS JOIN LATERAL (
+        SELECT trade_date, open, close, high, low, shares
+        FROM tw_stock_price p
+        WHERE p.stock_id = ids.stock_id
+        AND trade_date >= COALESCE($2::date, '-infinity'::date)
+        AND trade_date <= COALESCE($3::date, 'infinity'::date)
+        ORDER BY trade_date DESC
+        LIMIT $4
+    ) c
+    ORDER BY ids.stock_id, c.trade_date DESC
+""")
+
+# 多股票週K / 月K 查詢
+BATCH_RESAMPLED_CHART_QUERY = register_statement("stock_chart_batch_resampled", """
+    SELECT ids.stock_id, c.trade_date, c.open, c.close, c.high, c.low, c.shares
+    FROM unnest($1::text[]) AS ids(stock_id)
+    CROSS JOIN LATERAL (
+        SELECT
+            MIN(trade_date) as trade_date,
+            (ARRAY_AGG(open ORDER BY trade_date))[1] as open,
+            (ARRAY_AGG(close ORDER BY trade_date DESC))[1] as close,
+            MAX(high) as high,
+            MIN(low) as low,
+            SUM(shares) as shares
+        FROM tw_stock_price p
+        WHERE p.stock_id = ids.stock_id
+        AND trade_date >= COALESCE($2::date, '-infinity'::date)
+        AND trade_date <= COALESCE($3::date, 'infinity'::date)
+        GROUP BY date_trunc($5::text, trade_date)
+        ORDER BY MIN(trade_date) DESC
+        LIMIT $4
+    ) c
+    ORDER BY ids.stock_id, c.trade_date DESC
+""")
+
+def parse_stock_ids(stock_ids: str) -> List[str]:
+    """解析逗號分隔的股票代號，去除空白與重複並保持順序"""
+    return list(dict.fromkeys(stock_id.strip() for stock_id in stock_ids.split(",") if stock_id.strip()))
+
+def group_by_stock(rows, stock_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """依股票代號分組，結果順序與請求順序一致，每檔的K棒依 trade_date 由新到舊"""
+    grouped: Dict[str, List[Dict[str, Any]]] = {stock_id: [] for stock_id in stock_ids}
+    for row in rows:
+        item = dict(row)
+        grouped[item.pop("stock_id")].append(item)
+    return grouped
+
+def _to_float(value) -> Optional[float]:
+    """將價格欄位轉為 float，None 保持不變"""
+    return float(value) if value is not None else None
+
+def lttb_indices(values: List[Optional[float]], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets 降採樣
+    以索引作為 x 軸，返回需要保留的點的索引（升序）
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    # 缺值以前一個有效值補齊，避免三角形面積無法計算
+    ys: List[float] = []
+    last = 0.0
+    for value in values:
+        if value is not None:
+            last = float(value)
+        ys.append(last)
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # 下一個桶的平均點
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = (next_start + next_end - 1) / 2.0
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        # 當前桶中與前一個選中點、下一桶平均點組成最大三角形的點
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = a, ys[a]
+        max_area = -1.0
+        max_index = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - j) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                max_index = j
+
+        selected.append(max_index)
+        a = max_index
+
+    selected.append(n - 1)
+    return selected
+
+def downsample_ohlcv(rows: List[Dict[str, Any]], points: int) -> List[Dict[str, Any]]:
+    """
+    以收盤價為基準對 K 線做 LTTB 降採樣
+    rows 需依 trade_date 由新到舊排列，返回結果維持相同順序
+    """
+    if points is None or len(rows) <= points:
+        return rows
+
+    ascending = list(reversed(rows))
+    indices = lttb_indices([_to_float(row["close"]) for row in ascending], points)
+    return [ascending[i] for i in reversed(indices)]
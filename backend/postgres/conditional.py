@@ -0,0 +1,101 @@
+"""
+條件式 GET 模組
+以各資料表的最新交易日期與產業對照版本產生 ETag / Last-Modified，
+客戶端帶 If-None-Match / If-Modified-Since 且資料未更新時直接回應 304，不執行彙總查詢
+"""
+
+import hashlib
+import os
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+from .analytics_cache import get_latest_trade_dates
+from .industry import get_industry_map_version
+
+load_dotenv()
+
+# Cache-Control 的 max-age 秒數，0 表示每次都向伺服器確認
+HTTP_CACHE_MAX_AGE = int(os.getenv("POSTGRES_HTTP_CACHE_MAX_AGE", "0"))
+
+# 不完整或可能落後的回應使用，不帶 ETag / Last-Modified
+NO_STORE_HEADERS = {"Cache-Control": "no-store"}
+
+def _cache_control() -> str:
+    if HTTP_CACHE_MAX_AGE > 0:
+        return f"public, max-age={HTTP_CACHE_MAX_AGE}"
+    return "no-cache"
+
+def _to_datetime(value) -> Optional[datetime]:
+    """將交易日期轉為 UTC 午夜的 datetime"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime.combine(value, time.min, tzinfo=timezone.utc)
+    return None
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """比對 If-None-Match，忽略弱驗證前綴"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+async def check_not_modified(
+    request: Request,
+    route: str,
+    params: Tuple,
+    tables: Tuple[str, ...],
+    use_industry_map: bool = True
+) -> Tuple[Optional[Response], Dict[str, str]]:
+    """
+    計算路由回應的驗證標頭
+    資料未更新時返回 (304 回應, 標頭)，否則返回 (None, 標頭)，由路由將標頭加到完整回應上
+    """
+    latest = await get_latest_trade_dates()
+    trade_dates = tuple(latest[table] for table in tables)
+    map_version = get_industry_map_version() if use_industry_map else None
+
+    validator = repr((route, params, trade_dates, map_version)).encode()
+    etag = f'W/"{hashlib.sha1(validator).hexdigest()[:20]}"'
+    headers = {"ETag": etag, "Cache-Control": _cache_control()}
+
+    modified = [value for value in (_to_datetime(d) for d in trade_dates) if value is not None]
+    last_modified = max(modified) if modified else None
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    # If-None-Match 優先於 If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = (
+            if_modified_since is not None
+            and last_modified is not None
+            and map_version is None
+            and _not_modified_since(if_modified_since, last_modified)
+        )
+
+    if not_modified:
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
+
+def with_headers(response: Response, headers: Dict[str, Any]) -> Response:
+    """將驗證標頭加到回應上"""
+    response.headers.update(headers)
+    return response
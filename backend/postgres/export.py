@@ -0,0 +1,205 @@
+"""
+查詢結果串流匯出模組
+透過伺服器端游標分批讀取，以 NDJSON、CSV 或 Arrow IPC 格式逐塊輸出
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow 為選用依賴
+    pa = None
+
+from .connection import close_connection
+
+load_dotenv()
+
+# 單次匯出的行數上限與每批讀取的行數
+STREAM_MAX_ROWS = int(os.getenv("POSTGRES_STREAM_MAX_ROWS", "1000000"))
+STREAM_CHUNK_SIZE = int(os.getenv("POSTGRES_STREAM_CHUNK_SIZE", "5000"))
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def arrow_available() -> bool:
+    """是否已安裝 pyarrow"""
+    return pa is not None
+
+def _json_default(value: Any):
+    """JSON 無法直接編碼的型別轉換"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return str(value)
+
+class NdjsonEncoder:
+    """每行一個 JSON 物件"""
+
+    def __init__(self, columns: List[str], type_names: List[str]):
+        self.columns = columns
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        lines = [json.dumps(dict(row), default=_json_default, ensure_ascii=False) for row in rows]
+        return ("\n".join(lines) + "\n").encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+class CsvEncoder:
+    """含標題列的 CSV"""
+
+    def __init__(self, columns: List[str], type_names: List[str]):
+        self.columns = columns
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._write([self.columns])
+
+    def encode(self, rows) -> bytes:
+        return self._write([["" if value is None else value for value in row] for row in rows])
+
+    def footer(self) -> bytes:
+        return b""
+
+def infer_type_name(values: Sequence[Any]) -> str:
+    """
+    沒有欄位型別資訊時（例如 fetch 返回的 Record），依欄位中非 NULL 值的 Python 型別對應 PostgreSQL 型別名稱
+    型別混雜或無對應的值（inet、uuid、陣列等）返回 text，以字串輸出
+    """
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add("bool")
+        elif isinstance(value, int):
+            kinds.add("int8")
+        elif isinstance(value, (float, Decimal)):
+            kinds.add("float8")
+        elif isinstance(value, datetime):
+            kinds.add("timestamp" if value.tzinfo is None else "timestamptz")
+        elif isinstance(value, date):
+            kinds.add("date")
+        else:
+            kinds.add("text")
+    if kinds == {"int8", "float8"}:
+        return "float8"
+    return kinds.pop() if len(kinds) == 1 else "text"
+
+class ArrowEncoder:
+    """
+    Arrow IPC 串流格式
+    依 PostgreSQL 欄位型別建立 schema，numeric 轉為 float64，無對應型別的欄位以字串輸出；
+    metadata 寫入 schema metadata
+    """
+
+    def __init__(self, columns: List[str], type_names: List[str], metadata: Optional[Dict[str, bytes]] = None):
+        if pa is None:
+            raise RuntimeError("伺服器未安裝 pyarrow，無法輸出 Arrow 格式")
+        self.columns = columns
+        self.schema = pa.schema(
+            [(name, self._arrow_type(type_name)) for name, type_name in zip(columns, type_names)],
+            metadata=metadata
+        )
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    @staticmethod
+    def _arrow_type(type_name: str):
+        mapping = {
+            "int2": pa.int16(),
+            "int4": pa.int32(),
+            "int8": pa.int64(),
+            "float4": pa.float32(),
+            "float8": pa.float64(),
+            "numeric": pa.float64(),
+            "bool": pa.bool_(),
+            "date": pa.date32(),
+            "timestamp": pa.timestamp("us"),
+            "timestamptz": pa.timestamp("us", tz="UTC"),
+            "text": pa.string(),
+            "varchar": pa.string(),
+            "bpchar": pa.string(),
+        }
+        return mapping.get(type_name, pa.string())
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate(0)
+        return data
+
+    def _column(self, rows, index: int, field):
+        values = [row[index] for row in rows]
+        if pa.types.is_floating(field.type):
+            return [None if v is None else float(v) for v in values]
+        if pa.types.is_string(field.type):
+            return [None if v is None else str(v) for v in values]
+        return values
+
+    def header(self) -> bytes:
+        return self._drain()
+
+    def encode(self, rows) -> bytes:
+        arrays = [
+            pa.array(self._column(rows, i, field), type=field.type)
+            for i, field in enumerate(self.schema)
+        ]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._drain()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+EXPORT_ENCODERS = {
+    "ndjson": NdjsonEncoder,
+    "csv": CsvEncoder,
+    "arrow": ArrowEncoder,
+}
+
+async def stream_cursor(conn, transaction, cursor, encoder, max_rows: int, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    從伺服器端游標分批讀取並編碼輸出
+    結束或客戶端中斷時回滾唯讀交易並歸還連接
+    """
+    try:
+        header = encoder.header()
+        if header:
+            yield header
+
+        sent = 0
+        while sent < max_rows:
+            rows = await cursor.fetch(min(chunk_size, max_rows - sent))
+            if not rows:
+                break
+            sent += len(rows)
+            yield encoder.encode(rows)
+
+        footer = encoder.footer()
+        if footer:
+            yield footer
+    finally:
+        try:
+            await transaction.rollback()
+        except Exception:
+            pass
+        await close_connection(conn)
@@ -0,0 +1,232 @@
+"""
+股票技術指標計算模組
+以 NumPy 一次批次計算均線、EMA、RSI、MACD、布林帶與成交量均線
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from .statements import register_statement
+
+# 預設指標參數
+MA_PERIODS = (5, 10, 20, 30, 60)
+EMA_PERIODS = (12, 26)
+VOLUME_MA_PERIODS = (5, 20)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_PERIOD, BOLLINGER_STD = 20, 2.0
+
+# 指標快取上限（依股票數量計）
+INDICATOR_CACHE_SIZE = 256
+
+# 單一股票最新交易日期，用於判斷快取是否仍有效
+LAST_TRADE_DATE_QUERY = register_statement("stock_last_trade_date", """
+    SELECT MAX(trade_date) FROM tw_stock_price WHERE stock_id = $1
+""")
+
+# 計算指標所需的完整收盤價與成交量序列（升序）
+INDICATOR_SERIES_QUERY = register_statement("stock_indicator_series", """
+    SELECT trade_date, close, shares
+    FROM tw_stock_price
+    WHERE stock_id = $1
+    ORDER BY trade_date
+""")
+
+# 快取: stock_id -> (最新交易日期, 指標結果)
+_indicator_cache: "OrderedDict[str, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+
+def get_cached_indicators(stock_id: str, last_trade_date) -> Optional[Dict[str, Any]]:
+    """取得快取的指標結果，最新交易日期不符時視為失效"""
+    entry = _indicator_cache.get(stock_id)
+    if entry is None or entry[0] != last_trade_date:
+        return None
+    _indicator_cache.move_to_end(stock_id)
+    return entry[1]
+
+def set_cached_indicators(stock_id: str, last_trade_date, result: Dict[str, Any]):
+    """寫入指標快取，超過上限時淘汰最久未使用的股票"""
+    _indicator_cache[stock_id] = (last_trade_date, result)
+    _indicator_cache.move_to_end(stock_id)
+    while len(_indicator_cache) > INDICATOR_CACHE_SIZE:
+        _indicator_cache.popitem(last=False)
+
+def _forward_fill(values: List[Any]) -> np.ndarray:
+    """轉為 float 陣列，缺值以前一個有效值補齊"""
+    arr = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    mask = np.isnan(arr)
+    if mask.all():
+        return np.zeros_like(arr)
+    idx = np.where(~mask, np.arange(arr.size), 0)
+    np.maximum.accumulate(idx, out=idx)
+    arr = arr[idx]
+    # 開頭的缺值以第一個有效值補齊
+    arr[np.isnan(arr)] = arr[~np.isnan(arr)][0]
+    return arr
+
+def _rolling_sums(values: np.ndarray, period: int) -> np.ndarray:
+    """以累積和計算滑動窗口總和，前 period-1 筆為 NaN"""
+    out = np.full(values.size, np.nan)
+    if values.size < period:
+        return out
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    out[period - 1:] = csum[period:] - csum[:-period]
+    return out
+
+def _sma(values: np.ndarray, period: int) -> np.ndarray:
+    """簡單移動平均"""
+    return _rolling_sums(values, period) / period
+
+# 閉式解分塊時每塊內權重的最大指數，e^50 遠低於 float64 上限且不損失精度
+_BLOCK_EXPONENT = 50.0
+
+def _linear_recursive(x: np.ndarray, alphas: np.ndarray, initial: np.ndarray) -> np.ndarray:
+    """
+    以閉式累積權重同時計算多條一階遞迴濾波 y[t] = y[t-1] + alpha * (x[t] - y[t-1])
+    x 的每一列為一條序列，y[:, 0] 為 initial，x[:, 0] 不使用。
+    區塊內 y[b+j] = r^(j+1) * y[b-1] + r^j * cumsum(alpha * x[b+i] / r^i)，r = 1 - alpha；
+    r^-i 隨長度指數成長，依最大衰減率切成數個區塊，區塊內全部以 NumPy 一次計算
+    """
+    rows, n = x.shape
+    y = np.empty((rows, n))
+    if n == 0:
+        return y
+    y[:, 0] = initial
+    decay = 1.0 - alphas
+    block = max(1, int(_BLOCK_EXPONENT / -np.log(decay.min())))
+
+    steps = np.arange(block + 1)
+    # powers[:, j] = r^j，inverse[:, j] = r^-j
+    powers = decay[:, None] ** steps
+    inverse = 1.0 / powers
+    previous = y[:, 0]
+    for begin in range(1, n, block):
+        stop = min(begin + block, n)
+        size = stop - begin
+        weighted = np.cumsum(alphas[:, None] * x[:, begin:stop] * inverse[:, :size], axis=1)
+        y[:, begin:stop] = powers[:, 1:size + 1] * previous[:, None] + powers[:, :size] * weighted
+        previous = y[:, stop - 1]
+    return y
+
+def _recursive_smoothers(close: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    以一次批次的遞迴濾波計算所有遞迴型指標
+    EMA 與 RSI 的 Wilder 平滑同批計算，MACD 訊號線依賴 EMA 結果再計算一次
+    """
+    n = close.size
+    spans = sorted(set(EMA_PERIODS) | {MACD_FAST, MACD_SLOW})
+    avg_gain = np.full(n, np.nan)
+    avg_loss = np.full(n, np.nan)
+    if n == 0:
+        return {"spans": spans, "ema": np.empty((0, len(spans))), "avg_gain": avg_gain, "avg_loss": avg_loss, "signal": np.empty(0)}
+
+    diff = np.diff(close, prepend=close[0])
+    gains = np.clip(diff, 0, None)
+    losses = np.clip(-diff, 0, None)
+
+    # EMA 自第 0 筆起算；RSI 以前 RSI_PERIOD 筆的平均作為第 RSI_PERIOD 筆的起始值，
+    # 之後使用 Wilder 平滑，左移 RSI_PERIOD 筆後與 EMA 同批計算
+    has_rsi = n > RSI_PERIOD
+    series = [np.broadcast_to(close, (len(spans), n))]
+    alphas = [2.0 / (np.array(spans) + 1)]
+    initial = [np.full(len(spans), close[0])]
+    if has_rsi:
+        tail = np.zeros((2, n))
+        tail[0, :n - RSI_PERIOD] = gains[RSI_PERIOD:]
+        tail[1, :n - RSI_PERIOD] = losses[RSI_PERIOD:]
+        series.append(tail)
+        alphas.append(np.full(2, 1.0 / RSI_PERIOD))
+        initial.append(np.array([gains[1:RSI_PERIOD + 1].mean(), losses[1:RSI_PERIOD + 1].mean()]))
+    smoothed = _linear_recursive(np.vstack(series), np.concatenate(alphas), np.concatenate(initial))
+
+    ema = smoothed[:len(spans)].T
+    if has_rsi:
+        avg_gain[RSI_PERIOD:] = smoothed[len(spans), :n - RSI_PERIOD]
+        avg_loss[RSI_PERIOD:] = smoothed[len(spans) + 1, :n - RSI_PERIOD]
+
+    macd = ema[:, spans.index(MACD_FAST)] - ema[:, spans.index(MACD_SLOW)]
+    signal = _linear_recursive(macd[None, :], np.array([2.0 / (MACD_SIGNAL + 1)]), np.zeros(1))[0]
+
+    return {"spans": spans, "ema": ema, "avg_gain": avg_gain, "avg_loss": avg_loss, "signal": signal}
+
+def _to_list(values: np.ndarray) -> List[Optional[float]]:
+    """四捨五入到小數點第二位，NaN 轉為 None"""
+    rounded = np.round(values, 2)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+def compute_indicators(rows: List[Any]) -> Dict[str, Any]:
+    """
+    計算完整技術指標
+    rows 需依 trade_date 升序排列，包含 trade_date、close、shares 欄位
+    """
+    dates = [row["trade_date"] for row in rows]
+    close = _forward_fill([row["close"] for row in rows])
+    volume = np.array([float(row["shares"] or 0) for row in rows], dtype=np.float64)
+
+    result: Dict[str, Any] = {"dates": [d.strftime('%Y-%m-%d') for d in dates]}
+
+    # 均線
+    for period in MA_PERIODS:
+        result[f"ma{period}"] = _to_list(_sma(close, period))
+
+    # 遞迴型指標
+    smoothers = _recursive_smoothers(close)
+    spans, ema = smoothers["spans"], smoothers["ema"]
+    for period in EMA_PERIODS:
+        result[f"ema{period}"] = _to_list(ema[:, spans.index(period)])
+
+    # RSI
+    avg_gain, avg_loss = smoothers["avg_gain"], smoothers["avg_loss"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        rsi = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + rs))
+    rsi[np.isnan(avg_gain)] = np.nan
+    result[f"rsi{RSI_PERIOD}"] = _to_list(rsi)
+
+    # MACD
+    macd = ema[:, spans.index(MACD_FAST)] - ema[:, spans.index(MACD_SLOW)]
+    signal = smoothers["signal"]
+    warmup = min(MACD_SLOW - 1, close.size)
+    macd_line, signal_line = macd.copy(), signal.copy()
+    macd_line[:warmup] = np.nan
+    signal_line[:min(warmup + MACD_SIGNAL - 1, close.size)] = np.nan
+    result["macd"] = {
+        "macd": _to_list(macd_line),
+        "signal": _to_list(signal_line),
+        "histogram": _to_list(macd_line - signal_line),
+    }
+
+    # 布林帶（母體標準差）
+    mean = _sma(close, BOLLINGER_PERIOD)
+    mean_sq = _rolling_sums(close * close, BOLLINGER_PERIOD) / BOLLINGER_PERIOD
+    std = np.sqrt(np.clip(mean_sq - mean * mean, 0, None))
+    result["bollinger"] = {
+        "upper": _to_list(mean + BOLLINGER_STD * std),
+        "middle": _to_list(mean),
+        "lower": _to_list(mean - BOLLINGER_STD * std),
+    }
+
+    # 成交量均線
+    for period in VOLUME_MA_PERIODS:
+        result[f"volume_ma{period}"] = _to_list(_sma(volume, period))
+
+    return result
+
+def slice_indicators(result: Dict[str, Any], start=None, end=None) -> Dict[str, Any]:
+    """依日期範圍截取指標結果"""
+    if start is None and end is None:
+        return result
+
+    dates = result["dates"]
+    start_str = start.strftime('%Y-%m-%d') if start else None
+    end_str = end.strftime('%Y-%m-%d') if end else None
+    lo = 0 if start_str is None else bisect_left(dates, start_str)
+    hi = len(dates) if end_str is None else bisect_right(dates, end_str)
+
+    def _slice(value):
+        if isinstance(value, dict):
+            return {k: _slice(v) for k, v in value.items()}
+        return value[lo:hi]
+
+    return {key: _slice(value) for key, value in result.items()}
@@ -0,0 +1,145 @@
+"""
+股票產業對照索引模組
+啟動時從 monthly_revenue 載入每檔股票最新的產業別，之後每次檢查只重讀最新月份以後的資料增量更新，
+同一月份晚到的資料也會納入；索引同步寫入 stock_industry_map 資料表，供分析查詢直接 JOIN
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Optional, Any
+from dotenv import load_dotenv
+
+from .connection import acquire_connection
+
+load_dotenv()
+
+# 檢查 monthly_revenue 是否有新月份的最短間隔秒數
+INDUSTRY_INDEX_REFRESH_INTERVAL = float(os.getenv("POSTGRES_INDUSTRY_INDEX_REFRESH_INTERVAL", "300"))
+
+CREATE_INDUSTRY_MAP_TABLE = """
+    CREATE TABLE IF NOT EXISTS stock_industry_map (
+        stock_id TEXT PRIMARY KEY,
+        industry_type TEXT
+    )
+"""
+
+LATEST_REPORT_MONTH_QUERY = """
+    SELECT MAX(report_month) FROM monthly_revenue
+"""
+
+# 每檔股票最新的產業別（全量）
+INDUSTRY_MAPPING_QUERY = """
+    SELECT DISTINCT ON (stock_id)
+        stock_id, industry_type, report_month
+    FROM monthly_revenue
+    ORDER BY stock_id, report_month DESC
+"""
+
+# 只讀取上次載入的最新月份（含）之後的資料，同一月份晚到的資料也會讀到
+INDUSTRY_MAPPING_SINCE_QUERY = """
+    SELECT DISTINCT ON (stock_id)
+        stock_id, industry_type, report_month
+    FROM monthly_revenue
+    WHERE report_month >= $1
+    ORDER BY stock_id, report_month DESC
+"""
+
+UPSERT_INDUSTRY_MAP = """
+    INSERT INTO stock_industry_map (stock_id, industry_type)
+    SELECT * FROM UNNEST($1::text[], $2::text[])
+    ON CONFLICT (stock_id) DO UPDATE
+    SET industry_type = EXCLUDED.industry_type
+    WHERE stock_industry_map.industry_type IS DISTINCT FROM EXCLUDED.industry_type
+"""
+
+# 全局產業索引
+_industry_map: Dict[str, Optional[str]] = {}
+_latest_report_month: Optional[Any] = None
+# 產業對照內容的版本，對照有任何變動時改變
+_map_version: Optional[str] = None
+_last_checked: float = 0.0
+_loaded = False
+_lock = asyncio.Lock()
+
+async def _sync_industry_map(conn, changes: Dict[str, Optional[str]]):
+    """將變動的產業對照寫入 stock_industry_map"""
+    if not changes:
+        return
+    await conn.execute(UPSERT_INDUSTRY_MAP, list(changes.keys()), list(changes.values()))
+
+def _compute_map_version() -> Optional[str]:
+    """以最新營收月份與對照內容的雜湊作為版本，各工作進程對相同內容得到相同版本"""
+    if _latest_report_month is None:
+        return None
+    digest = hashlib.sha1(repr(sorted(_industry_map.items())).encode()).hexdigest()[:12]
+    return f"{_latest_report_month}:{digest}"
+
+async def _refresh(conn, force: bool = False):
+    """重讀最新月份以後的資料，有變動時增量更新"""
+    global _latest_report_month, _map_version, _last_checked, _loaded
+
+    latest = await conn.fetchval(LATEST_REPORT_MONTH_QUERY)
+    _last_checked = time.monotonic()
+
+    # 首次載入時建立資料表並全量讀取，之後只讀取上次最新月份（含）以後的資料
+    if not _loaded or force or _latest_report_month is None:
+        await conn.execute(CREATE_INDUSTRY_MAP_TABLE)
+        rows = await conn.fetch(INDUSTRY_MAPPING_QUERY)
+    else:
+        rows = await conn.fetch(INDUSTRY_MAPPING_SINCE_QUERY, _latest_report_month)
+    changes = {}
+    for row in rows:
+        if _industry_map.get(row['stock_id'], ...) != row['industry_type']:
+            changes[row['stock_id']] = row['industry_type']
+
+    if _loaded and not changes and latest == _latest_report_month:
+        return
+
+    await _sync_industry_map(conn, changes)
+    _industry_map.update(changes)
+    _latest_report_month = latest
+    _map_version = _compute_map_version()
+    _loaded = True
+    print(f"✅ 產業對照索引已更新: {len(changes)} 筆變動，共 {len(_industry_map)} 檔股票")
+
+async def ensure_industry_index(conn=None, force: bool = False):
+    """
+    確保產業索引已載入且為最新
+    距上次檢查未超過 INDUSTRY_INDEX_REFRESH_INTERVAL 秒時直接返回
+    未傳入連接且需要更新時，從連接池取得連接
+    """
+    if _loaded and not force and time.monotonic() - _last_checked < INDUSTRY_INDEX_REFRESH_INTERVAL:
+        return
+    async with _lock:
+        if _loaded and not force and time.monotonic() - _last_checked < INDUSTRY_INDEX_REFRESH_INTERVAL:
+            return
+        if conn is not None:
+            await _refresh(conn, force=force)
+            return
+        async with acquire_connection() as pooled_conn:
+            await _refresh(pooled_conn, force=force)
+
+async def init_industry_index():
+    """應用啟動時載入產業索引"""
+    try:
+        await ensure_industry_index()
+    except Exception as e:
+        print(f"❌ 產業對照索引載入失敗: {e}")
+
+def get_industry_type(stock_id: str) -> Optional[str]:
+    """查詢股票的產業別"""
+    return _industry_map.get(stock_id)
+
+def get_industry_index() -> Dict[str, Optional[str]]:
+    """返回完整的產業對照索引"""
+    return _industry_map
+
+def get_latest_report_month() -> Optional[Any]:
+    """返回產業索引目前對應的最新營收月份"""
+    return _latest_report_month
+
+def get_industry_map_version() -> Optional[str]:
+    """返回產業對照的版本，月份前進或同一月份有晚到的變動時改變，供快取與彙總判斷是否失效"""
+    return _map_version
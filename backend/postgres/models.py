@@ -12,6 +12,25 @@ class ConnectionStatus(str, Enum):
     SUCCESS = "success"
     ERROR = "error"
 
+class ExportFormat(str, Enum):
+    """串流匯出格式枚舉"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+
+class ResponseFormat(str, Enum):
+    """查詢回應格式枚舉"""
+    JSON = "json"
+    COLUMNAR = "columnar"
+    ARROW = "arrow"
+
+class StreamableResponseFormat(str, Enum):
+    """查詢回應格式加上以伺服器端游標串流的 ndjson"""
+    JSON = "json"
+    COLUMNAR = "columnar"
+    ARROW = "arrow"
+    NDJSON = "ndjson"
+
 class PostgresConnectionTest(BaseModel):
     """PostgreSQL 連接測試響應模型"""
     status: ConnectionStatus
@@ -25,6 +44,7 @@ class TableInfo(BaseModel):
     table_schema: str
     table_type: str
     row_count: Optional[int] = None
+    row_count_estimated: Optional[bool] = None
 
 class ColumnInfo(BaseModel):
     """欄位信息模型"""
@@ -54,6 +74,13 @@ class QueryResult(BaseModel):
     data: List[Dict[str, Any]]
     row_count: int
     execution_time: Optional[float] = None
+    # 結果快取狀態: HIT / MISS / BYPASS，未啟用快取時為 None
+    cache_status: Optional[str] = None
+    cache_age: Optional[float] = None
+    # 游標工作階段模式下的游標代號與是否還有下一頁
+    cursor: Optional[str] = None
+    has_more: Optional[bool] = None
+    position: Optional[int] = None
 
 class CreateTableRequest(BaseModel):
     """創建資料表請求模型"""
@@ -67,6 +94,15 @@ class InsertDataRequest(BaseModel):
     data: Dict[str, Any]
     schema_name: str = "public"
 
+class BatchInsertRequest(BaseModel):
+    """批次插入 / 更新數據請求模型，records 與 columns 擇一提供"""
+    records: Optional[List[Dict[str, Any]]] = None  # [{"stock_id": "2330", "close": 600}, ...]
+    columns: Optional[Dict[str, List[Any]]] = None  # {"stock_id": ["2330", ...], "close": [600, ...]}
+    schema_name: str = "public"
+    conflict_columns: Optional[List[str]] = None  # 指定時以 ON CONFLICT 進行 upsert
+    update_columns: Optional[List[str]] = None  # 衝突時更新的欄位，預設為衝突欄位以外的所有欄位
+    batch_size: int = Field(5000, ge=1, le=100000)
+
 class UpdateDataRequest(BaseModel):
     """更新數據請求模型"""
     table_name: str
@@ -83,6 +119,19 @@ class DeleteDataRequest(BaseModel):
 class CustomQueryRequest(BaseModel):
     """自定義查詢請求模型"""
     query: str
-    limit: Optional[int] = 100
-    offset: Optional[int] = 0
+    limit: int = Field(100, ge=1)
+    offset: int = Field(0, ge=0)
+    params: Optional[List[Any]] = []
+    format: ResponseFormat = ResponseFormat.JSON
+    # 啟用結果快取與其存活秒數（未指定時使用 POSTGRES_QUERY_CACHE_TTL）
+    cache: bool = False
+    cache_ttl: Optional[float] = Field(None, gt=0)
+    # 以伺服器端游標分頁，返回的 cursor 交給 /postgres/query/sessions/{cursor} 讀取下一頁
+    session: bool = False
+
+class StreamQueryRequest(BaseModel):
+    """串流查詢請求模型"""
+    query: str
     params: Optional[List[Any]] = []
+    format: ExportFormat = ExportFormat.NDJSON
+    max_rows: Optional[int] = Field(None, ge=1)
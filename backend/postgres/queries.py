@@ -0,0 +1,280 @@
+"""
+固定分析查詢的 SQL 與具名語句註冊
+"""
+
+from .statements import register_statement
+
+# 上市三大法人買賣超產業彙總，$1 為查詢日期（NULL 表示最新交易日）
+TSE_INDUSTRY_TRADING = register_statement("industry_trading_tse", """
+    WITH industry_trading AS (
+        SELECT 
+            COALESCE(mr.industry_type, '未分類') as industry_type,
+            'TSE' as market,
+            SUM(tsi.foreign_excl_dealer_net + tsi.foreign_dealer_net) as foreign_net_amount,
+            SUM(tsi.investment_trust_net) as investment_trust_net_amount,
+            SUM(tsi.dealer_self_net + tsi.dealer_hedge_net) as dealer_net_amount,
+            SUM(tsi.total_net) as total_net_amount,
+            COUNT(DISTINCT tsi.stock_id) as stock_count
+        FROM twse_stock_insti tsi
+        LEFT JOIN stock_industry_map mr ON tsi.stock_id = mr.stock_id
+        WHERE tsi.trade_date = CASE 
+            WHEN $1::date IS NOT NULL THEN $1::date 
+            ELSE (SELECT MAX(trade_date) FROM twse_stock_insti) 
+        END
+        AND tsi.stock_id NOT LIKE '00%'
+        GROUP BY COALESCE(mr.industry_type, '未分類')
+    )
+    SELECT 
+        industry_type,
+        market,
+        foreign_net_amount,
+        investment_trust_net_amount,
+        dealer_net_amount,
+        total_net_amount,
+        stock_count,
+        ROW_NUMBER() OVER (ORDER BY ABS(total_net_amount) DESC) as rank_in_market
+    FROM industry_trading
+    ORDER BY ABS(total_net_amount) DESC
+""")
+
+# 上櫃三大法人買賣超產業彙總，$1 為查詢日期（NULL 表示最新交易日）
+TPEX_INDUSTRY_TRADING = register_statement("industry_trading_tpex", """
+    WITH industry_trading AS (
+        SELECT 
+            COALESCE(mr.industry_type, '未分類') as industry_type,
+            'TPEX' as market,
+            SUM(tsi.foreign_net) as foreign_net_amount,
+            SUM(tsi.investment_trust_net) as investment_trust_net_amount,
+            SUM(tsi.dealer_net) as dealer_net_amount,
+            SUM(tsi.total_net) as total_net_amount,
+            COUNT(DISTINCT tsi.stock_id) as stock_count
+        FROM tpex_stock_insti tsi
+        LEFT JOIN stock_industry_map mr ON tsi.stock_id = mr.stock_id
+        WHERE tsi.trade_date = CASE 
+            WHEN $1::date IS NOT NULL THEN $1::date 
+            ELSE (SELECT MAX(trade_date) FROM tpex_stock_insti) 
+        END
+        AND tsi.stock_id NOT LIKE '00%'
+        GROUP BY COALESCE(mr.industry_type, '未分類')
+    )
+    SELECT 
+        industry_type,
+        market,
+        foreign_net_amount,
+        investment_trust_net_amount,
+        dealer_net_amount,
+        total_net_amount,
+        stock_count,
+        ROW_NUMBER() OVER (ORDER BY ABS(total_net_amount) DESC) as rank_in_market
+    FROM industry_trading
+    ORDER BY ABS(total_net_amount) DESC
+""")
+
+# 上市特定產業的個股買賣超，$1 為產業別，$2 為查詢日期
+TSE_INDUSTRY_DETAILS = register_statement("industry_details_tse", """
+    SELECT 
+        tsi.stock_id,
+        tsi.stock_name,
+        tsi.foreign_excl_dealer_net + tsi.foreign_dealer_net as foreign_net_amount,
+        tsi.investment_trust_net as investment_trust_net_amount,
+        tsi.dealer_self_net + tsi.dealer_hedge_net as dealer_net_amount,
+        tsi.total_net as total_net_amount,
+        tsi.trade_date
+    FROM twse_stock_insti tsi
+    LEFT JOIN stock_industry_map mr ON tsi.stock_id = mr.stock_id
+    WHERE tsi.trade_date = CASE 
+        WHEN $2::date IS NOT NULL THEN $2::date 
+        ELSE (SELECT MAX(trade_date) FROM twse_stock_insti) 
+    END
+    AND COALESCE(mr.industry_type, '未分類') = $1
+    AND tsi.stock_id NOT LIKE '00%'
+    ORDER BY ABS(tsi.total_net) DESC
+""")
+
+# 上櫃特定產業的個股買賣超，$1 為產業別，$2 為查詢日期
+TPEX_INDUSTRY_DETAILS = register_statement("industry_details_tpex", """
+    SELECT 
+        tsi.stock_id,
+        tsi.stock_name,
+        tsi.foreign_net as foreign_net_amount,
+        tsi.investment_trust_net as investment_trust_net_amount,
+        tsi.dealer_net as dealer_net_amount,
+        tsi.total_net as total_net_amount,
+        tsi.trade_date
+    FROM tpex_stock_insti tsi
+    LEFT JOIN stock_industry_map mr ON tsi.stock_id = mr.stock_id
+    WHERE tsi.trade_date = CASE 
+        WHEN $2::date IS NOT NULL THEN $2::date 
+        ELSE (SELECT MAX(trade_date) FROM tpex_stock_insti) 
+    END
+    AND COALESCE(mr.industry_type, '未分類') = $1
+    AND tsi.stock_id NOT LIKE '00%'
+    ORDER BY ABS(tsi.total_net) DESC
+""")
+
+# 產業漲跌與成交量分析，$1 為查詢日期
+INDUSTRY_ANALYSIS = register_statement("industry_analysis", """
+    SELECT 
+      COALESCE(mr.industry_type, '未分類') as industry_type,
+      COALESCE(sp.market, '未分類') as market,
+      COUNT(DISTINCT sp.stock_id) as stock_count,
+      CASE 
+        WHEN SUM(sp.open) > 0 
+        THEN ROUND(((SUM(sp.close) - SUM(sp.open)) / SUM(sp.open)) * 100, 2)
+        ELSE 0 
+      END as avg_change_percent,
+      COALESCE(SUM(sp.amount) * 10000, 0) as total_volume
+    FROM tw_stock_price sp
+    LEFT JOIN stock_industry_map mr ON sp.stock_id = mr.stock_id
+    WHERE sp.trade_date = CASE 
+        WHEN $1::date IS NOT NULL THEN $1::date 
+        ELSE (SELECT MAX(trade_date) FROM tw_stock_price) 
+    END
+    AND sp.stock_id NOT LIKE '00%'
+    GROUP BY COALESCE(mr.industry_type, '未分類'), COALESCE(sp.market, '未分類')
+    ORDER BY total_volume DESC
+""")
+
+# 以下兩個查詢讀取 rollup.py 維護的產業每日彙總表，結果欄位與對應的原始查詢相同
+# 未指定日期時取彙總表本身的最新交易日，路由只在彙總已涵蓋來源資料表的最新交易日時使用
+
+# 三大法人買賣超產業彙總（彙總表），$1 為市場 (TSE / TPEX)，$2 為查詢日期
+ROLLUP_INDUSTRY_TRADING = register_statement("industry_trading_rollup", """
+    SELECT 
+        industry_type,
+        market,
+        foreign_net_amount,
+        investment_trust_net_amount,
+        dealer_net_amount,
+        total_net_amount,
+        stock_count,
+        ROW_NUMBER() OVER (ORDER BY ABS(total_net_amount) DESC) as rank_in_market
+    FROM industry_insti_daily
+    WHERE market = $1::text
+    AND trade_date = COALESCE($2::date, (
+        SELECT MAX(trade_date) FROM industry_insti_daily WHERE market = $1::text
+    ))
+    ORDER BY ABS(total_net_amount) DESC
+""")
+
+# 產業漲跌與成交量分析（彙總表），$1 為查詢日期
+ROLLUP_INDUSTRY_ANALYSIS = register_statement("industry_analysis_rollup", """
+    SELECT 
+      industry_type,
+      market,
+      stock_count,
+      CASE 
+        WHEN sum_open > 0 
+        THEN ROUND(((sum_close - sum_open) / sum_open) * 100, 2)
+        ELSE 0 
+      END as avg_change_percent,
+      COALESCE(total_amount * 10000, 0) as total_volume
+    FROM industry_price_daily
+    WHERE trade_date = COALESCE($1::date, (SELECT MAX(trade_date) FROM industry_price_daily))
+    ORDER BY total_volume DESC
+""")
+
+# 多日產業三大法人買賣超趨勢（彙總表）
+# $1 市場陣列，$2 / $3 起訖日期，$4 最多取最近幾個交易日（NULL 表示不限），$5 移動合計的交易日數
+# 區間前另取 $5 - 1 個交易日作為移動合計的暖身資料，cumulative 只累計區間內的數值
+INDUSTRY_FLOW_TRENDS = register_statement("industry_flow_trends", """
+    WITH trade_days AS (
+        SELECT DISTINCT trade_date
+        FROM industry_insti_daily
+        WHERE market = ANY($1::text[])
+        AND trade_date >= COALESCE($2::date, '-infinity'::date)
+        AND trade_date <= COALESCE($3::date, 'infinity'::date)
+        ORDER BY trade_date DESC
+        LIMIT $4
+    ),
+    bounds AS (
+        SELECT MIN(trade_date) as first_day, MAX(trade_date) as last_day FROM trade_days
+    ),
+    warmup AS (
+        SELECT COALESCE(MIN(trade_date), (SELECT first_day FROM bounds)) as warmup_day
+        FROM (
+            SELECT DISTINCT trade_date
+            FROM industry_insti_daily
+            WHERE market = ANY($1::text[])
+            AND trade_date < (SELECT first_day FROM bounds)
+            ORDER BY trade_date DESC
+            LIMIT $5::int - 1
+        ) w
+    ),
+    running AS (
+        SELECT
+            d.trade_date,
+            d.market,
+            d.industry_type,
+            d.stock_count,
+            d.foreign_net_amount,
+            d.investment_trust_net_amount,
+            d.dealer_net_amount,
+            d.total_net_amount,
+            SUM(d.foreign_net_amount) OVER w as foreign_running,
+            SUM(d.investment_trust_net_amount) OVER w as investment_trust_running,
+            SUM(d.dealer_net_amount) OVER w as dealer_running,
+            SUM(d.total_net_amount) OVER w as total_running,
+            SUM(d.foreign_net_amount) FILTER (WHERE d.trade_date >= b.first_day) OVER w as foreign_cumulative,
+            SUM(d.investment_trust_net_amount) FILTER (WHERE d.trade_date >= b.first_day) OVER w as investment_trust_cumulative,
+            SUM(d.dealer_net_amount) FILTER (WHERE d.trade_date >= b.first_day) OVER w as dealer_cumulative,
+            SUM(d.total_net_amount) FILTER (WHERE d.trade_date >= b.first_day) OVER w as total_cumulative
+        FROM industry_insti_daily d
+        CROSS JOIN bounds b
+        CROSS JOIN warmup
+        WHERE d.market = ANY($1::text[])
+        AND d.trade_date >= warmup.warmup_day
+        AND d.trade_date <= b.last_day
+        WINDOW w AS (PARTITION BY d.market, d.industry_type ORDER BY d.trade_date)
+    ),
+    trends AS (
+        SELECT
+            r.trade_date,
+            r.market,
+            r.industry_type,
+            r.stock_count,
+            r.foreign_net_amount,
+            r.investment_trust_net_amount,
+            r.dealer_net_amount,
+            r.total_net_amount,
+            r.foreign_cumulative,
+            r.investment_trust_cumulative,
+            r.dealer_cumulative,
+            r.total_cumulative,
+            r.foreign_running - COALESCE(LAG(r.foreign_running, $5::int) OVER w, 0) as foreign_rolling,
+            r.investment_trust_running - COALESCE(LAG(r.investment_trust_running, $5::int) OVER w, 0) as investment_trust_rolling,
+            r.dealer_running - COALESCE(LAG(r.dealer_running, $5::int) OVER w, 0) as dealer_rolling,
+            r.total_running - COALESCE(LAG(r.total_running, $5::int) OVER w, 0) as total_rolling
+        FROM running r
+        WINDOW w AS (PARTITION BY r.market, r.industry_type ORDER BY r.trade_date)
+    )
+    SELECT t.*
+    FROM trends t
+    CROSS JOIN bounds b
+    WHERE t.trade_date >= b.first_day
+    ORDER BY t.market, t.industry_type, t.trade_date
+""")
+
+# 股票清單
+STOCK_LIST = register_statement("stock_list", """
+    SELECT DISTINCT 
+      sp.stock_id, 
+      sp.stock_name, 
+      sp.market,
+      mr.industry_type
+    FROM tw_stock_price sp
+    LEFT JOIN stock_industry_map mr ON sp.stock_id = mr.stock_id
+    WHERE sp.stock_id NOT LIKE '00%'
+    ORDER BY sp.stock_id
+""")
+
+# 各來源資料表中最新的交易日期
+LATEST_TRADE_DATE = register_statement("latest_trade_date", """
+    SELECT MAX(latest_date) as latest_trade_date FROM (
+        SELECT MAX(trade_date) as latest_date FROM tw_stock_price
+        UNION ALL
+        SELECT MAX(trade_date) as latest_date FROM twse_stock_insti
+        UNION ALL
+        SELECT MAX(trade_date) as latest_date FROM tpex_stock_insti
+    ) dates
+""")
@@ -0,0 +1,169 @@
+"""
+自定義查詢結果快取模組
+以正規化後的查詢文字、params、limit 與 offset 作為快取鍵，每個項目有各自的存活時間，
+總量以位元組預算的 LRU 限制。只有請求明確啟用快取時才使用，命中時不取得資料庫連接
+"""
+
+import os
+import re
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+from .cache import LRUByteCache
+from .responses import dumps
+
+load_dotenv()
+
+# 未指定 cache_ttl 時的存活秒數、可指定的最長存活秒數與快取的位元組上限
+QUERY_CACHE_TTL = float(os.getenv("POSTGRES_QUERY_CACHE_TTL", "60"))
+QUERY_CACHE_MAX_TTL = float(os.getenv("POSTGRES_QUERY_CACHE_MAX_TTL", "3600"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("POSTGRES_QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+
+def _opaque_end(text: str, position: int) -> int:
+    """
+    若 position 開始的是字串、識別字、註解或 $$ 字串，返回其結束位置（不含），否則返回 -1
+    未結束的區段視為延伸到查詢結尾
+    """
+    char = text[position]
+    if char in ("'", '"'):
+        # E'...' 內以反斜線跳脫，其餘以連續兩個引號跳脫（視為相鄰的兩段，內容不受影響）
+        escaped = char == "'" and position > 0 and text[position - 1] in "Ee" and (
+            position == 1 or not (text[position - 2].isalnum() or text[position - 2] == "_")
+        )
+        index = position + 1
+        while index < len(text):
+            if escaped and text[index] == "\\":
+                index += 2
+                continue
+            if text[index] == char:
+                return index + 1
+            index += 1
+        return len(text)
+    if text.startswith("--", position):
+        # 註解保留到行尾的換行，避免合併後把下一行也變成註解
+        end = text.find("\n", position)
+        return len(text) if end == -1 else end + 1
+    if text.startswith("/*", position):
+        # 區塊註解可巢狀
+        depth = 0
+        index = position
+        while index < len(text):
+            if text.startswith("/*", index):
+                depth += 1
+                index += 2
+            elif text.startswith("*/", index):
+                depth -= 1
+                index += 2
+                if depth == 0:
+                    return index
+            else:
+                index += 1
+        return len(text)
+    if char == "$" and not (position > 0 and (text[position - 1].isalnum() or text[position - 1] == "_")):
+        match = _DOLLAR_TAG.match(text, position)
+        if match:
+            end = text.find(match.group(), match.end())
+            return len(text) if end == -1 else end + len(match.group())
+    return -1
+
+def normalize_query(query: str) -> str:
+    """
+    將字串與註解外連續的空白與換行合併為單一空格並去除結尾分號，
+    僅排版不同的相同查詢共用同一個快取項目；'...'、E'...'、$$...$$ 字串、識別字、-- 與 /* */ 註解保持原樣
+    """
+    text = query.strip().rstrip(';').rstrip()
+    parts: List[str] = []
+    position = 0
+    pending_space = False
+    while position < len(text):
+        char = text[position]
+        if char.isspace():
+            pending_space = True
+            position += 1
+            continue
+        if pending_space and parts:
+            parts.append(" ")
+        pending_space = False
+
+        end = _opaque_end(text, position)
+        if end == -1:
+            parts.append(char)
+            position += 1
+            continue
+        parts.append(text[position:end])
+        position = end
+    return "".join(parts)
+
+def parse_cache_control(header: Optional[str]) -> Tuple[bool, bool]:
+    """解析請求的 Cache-Control，返回 (是否略過快取讀取, 是否寫入快取)"""
+    if not header:
+        return False, True
+    directives = {directive.strip().split("=")[0].lower() for directive in header.split(",")}
+    if "no-store" in directives:
+        return True, False
+    return "no-cache" in directives, True
+
+class QueryResultCache:
+    """每個項目有各自存活時間、以位元組預算淘汰的查詢結果快取"""
+
+    def __init__(self, max_bytes: int):
+        self._data = LRUByteCache(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.bypasses = 0
+
+    @staticmethod
+    def make_key(query: str, params: Sequence[Any], limit: Optional[int], offset: Optional[int]) -> Hashable:
+        # params 以 JSON 編碼，讓 1 與 "1" 等不同型別的參數不會共用項目
+        return (normalize_query(query), dumps(list(params)), limit, offset)
+
+    def get(self, key: Hashable) -> Optional[Tuple[List[Any], float]]:
+        """返回 (行資料, 已快取秒數)，不存在或已過期時返回 None"""
+        entry = self._data.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[0] < now:
+            self._data.pop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        expires_at, stored_at, rows = entry
+        return rows, now - stored_at
+
+    def set(self, key: Hashable, rows: List[Any], ttl: float, size: int):
+        """寫入查詢結果，size 為回應編碼後的位元組數，避免只為估計大小再編碼一次"""
+        now = time.monotonic()
+        self._data.set(key, (now + ttl, now, rows), size)
+
+    def clear(self):
+        """清空快取，透過 API 寫入資料時呼叫"""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回快取命中統計"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._data),
+            "bytes": self._data.current_bytes,
+            "max_bytes": self._data.max_bytes,
+            "evictions": self._data.evictions,
+            "expirations": self.expirations
+        }
+
+def resolve_ttl(cache_ttl: Optional[float]) -> float:
+    """請求指定的存活秒數，限制在 QUERY_CACHE_MAX_TTL 以內"""
+    if cache_ttl is None:
+        return QUERY_CACHE_TTL
+    return min(cache_ttl, QUERY_CACHE_MAX_TTL)
+
+query_cache = QueryResultCache(QUERY_CACHE_MAX_BYTES)
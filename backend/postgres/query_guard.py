@@ -0,0 +1,152 @@
+"""
+自定義查詢防護模組
+執行前以 EXPLAIN 取得估計成本與行數，超過上限時拒絕執行；執行時在交易中設定 statement_timeout，
+避免單一查詢長時間佔用共享連接池。執行時間超過門檻的查詢記入慢查詢日誌，
+並於背景以 EXPLAIN (ANALYZE, BUFFERS) 重新取得實際執行計畫
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set
+
+import asyncpg
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from .connection import acquire_connection
+
+load_dotenv()
+
+# 估計總成本與估計返回行數的上限，0 表示不檢查
+QUERY_MAX_COST = float(os.getenv("POSTGRES_QUERY_MAX_COST", "1000000"))
+QUERY_MAX_ROWS = float(os.getenv("POSTGRES_QUERY_MAX_ROWS", "1000000"))
+# 每個自定義查詢的 statement_timeout 毫秒數，0 表示不限制
+QUERY_STATEMENT_TIMEOUT = int(os.getenv("POSTGRES_QUERY_STATEMENT_TIMEOUT", "30000"))
+# 執行時間超過此秒數的查詢記入慢查詢日誌
+SLOW_QUERY_THRESHOLD = float(os.getenv("POSTGRES_SLOW_QUERY_THRESHOLD", "1.0"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("POSTGRES_SLOW_QUERY_LOG_SIZE", "100"))
+# 是否對慢查詢以 EXPLAIN (ANALYZE, BUFFERS) 重新執行一次以取得實際計畫
+SLOW_QUERY_ANALYZE = os.getenv("POSTGRES_SLOW_QUERY_ANALYZE", "true").lower() == "true"
+
+_slow_queries: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+# 背景擷取 ANALYZE 計畫的工作，同時最多一個，避免慢查詢接連出現時再加重資料庫負載
+_analyze_tasks: Set[asyncio.Task] = set()
+
+def get_limits() -> Dict[str, Any]:
+    """目前的防護設定"""
+    return {
+        "max_cost": QUERY_MAX_COST,
+        "max_rows": QUERY_MAX_ROWS,
+        "statement_timeout_ms": QUERY_STATEMENT_TIMEOUT,
+        "slow_query_threshold": SLOW_QUERY_THRESHOLD,
+    }
+
+async def explain_query(conn, query: str, params: Sequence[Any], analyze: bool = False) -> Dict[str, Any]:
+    """以 EXPLAIN (FORMAT JSON) 取得查詢計畫；analyze 為 True 時會實際執行查詢"""
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    result = await conn.fetchval(f"EXPLAIN ({options}) {query}", *params)
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]
+
+def plan_estimates(plan: Dict[str, Any]) -> Dict[str, float]:
+    """取出最上層計畫節點的估計總成本與行數"""
+    root = plan["Plan"]
+    return {"total_cost": root["Total Cost"], "plan_rows": root["Plan Rows"]}
+
+def plan_violations(estimates: Dict[str, float], check_rows: bool = True) -> List[str]:
+    """返回估計值超過上限的說明，未超過時為空列表"""
+    violations = []
+    if QUERY_MAX_COST > 0 and estimates["total_cost"] > QUERY_MAX_COST:
+        violations.append(f"估計成本 {estimates['total_cost']:.0f} 超過上限 {QUERY_MAX_COST:.0f}")
+    if check_rows and QUERY_MAX_ROWS > 0 and estimates["plan_rows"] > QUERY_MAX_ROWS:
+        violations.append(f"估計行數 {estimates['plan_rows']:.0f} 超過上限 {QUERY_MAX_ROWS:.0f}")
+    return violations
+
+async def check_query_cost(conn, query: str, params: Sequence[Any], check_rows: bool = True) -> Dict[str, Any]:
+    """
+    執行前的成本檢查，超過上限時回應 400，否則返回估計計畫
+    串流匯出本來就會返回大量行，以 check_rows=False 只檢查成本
+    """
+    plan = await explain_query(conn, query, params)
+    violations = plan_violations(plan_estimates(plan), check_rows)
+    if violations:
+        raise HTTPException(
+            status_code=400,
+            detail=f"查詢已拒絕執行：{'；'.join(violations)}，請加上篩選條件或縮小查詢範圍"
+        )
+    return plan
+
+async def set_statement_timeout(conn):
+    """在目前交易中設定 statement_timeout，交易結束後自動還原"""
+    if QUERY_STATEMENT_TIMEOUT > 0:
+        await conn.execute("SELECT set_config('statement_timeout', $1, true)", str(QUERY_STATEMENT_TIMEOUT))
+
+def timeout_error() -> HTTPException:
+    """查詢因 statement_timeout 被取消時的錯誤"""
+    return HTTPException(
+        status_code=408,
+        detail=f"查詢執行超過 {QUERY_STATEMENT_TIMEOUT} 毫秒已被取消，請縮小查詢範圍"
+    )
+
+async def _capture_analyze(entry: Dict[str, Any], query: str, params: Sequence[Any]):
+    """以另一個連接在唯讀交易中執行 EXPLAIN (ANALYZE, BUFFERS)，結果寫回日誌項目"""
+    try:
+        async with acquire_connection() as conn:
+            async with conn.transaction(readonly=True):
+                await set_statement_timeout(conn)
+                entry["analyze_plan"] = await explain_query(conn, query, params, analyze=True)
+    except Exception as e:
+        entry["analyze_error"] = str(e)
+
+def record_slow_query(
+    query: str,
+    params: Sequence[Any],
+    execution_time: float,
+    plan: Optional[Dict[str, Any]],
+    row_count: Optional[int],
+    timed_out: bool = False
+):
+    """
+    執行時間超過門檻時記入慢查詢日誌
+    因 statement_timeout 被取消的查詢一律記錄，執行時間至少為逾時設定，且不再背景執行 ANALYZE（必定再次逾時）
+    """
+    if timed_out:
+        execution_time = max(execution_time, QUERY_STATEMENT_TIMEOUT / 1000)
+    elif execution_time < SLOW_QUERY_THRESHOLD:
+        return
+
+    entry = {
+        "query": query,
+        "params": list(params),
+        "execution_time": execution_time,
+        "row_count": row_count,
+        "timed_out": timed_out,
+        "logged_at": datetime.now(timezone.utc),
+        "estimates": plan_estimates(plan) if plan is not None else None,
+        "plan": plan,
+        "analyze_plan": None,
+    }
+    _slow_queries.append(entry)
+    if timed_out:
+        print(f"❌ 查詢執行逾時 {execution_time:.2f} 秒已取消: {query[:200]}")
+        return
+    print(f"❌ 慢查詢 {execution_time:.2f} 秒，返回 {row_count} 行: {query[:200]}")
+
+    if SLOW_QUERY_ANALYZE and not _analyze_tasks:
+        task = asyncio.create_task(_capture_analyze(entry, query, params))
+        _analyze_tasks.add(task)
+        task.add_done_callback(_analyze_tasks.discard)
+
+def get_slow_queries(limit: int) -> List[Dict[str, Any]]:
+    """最近的慢查詢，新的在前"""
+    return list(reversed(_slow_queries))[:limit]
+
+def clear_slow_queries():
+    _slow_queries.clear()
+
+def is_timeout(error: Exception) -> bool:
+    return isinstance(error, asyncpg.exceptions.QueryCanceledError)
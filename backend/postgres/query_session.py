@@ -0,0 +1,181 @@
+"""
+自定義查詢游標工作階段模組
+以 SCROLL 伺服器端游標取代 LIMIT / OFFSET 分頁：游標在專屬連接的唯讀交易中宣告，
+之後每一頁以 FETCH 從目前位置讀取，不必重新掃描並丟棄前面的行。
+工作階段閒置超過 QUERY_SESSION_IDLE_TTL 秒時自動關閉並歸還連接，
+同時開啟的工作階段數以 QUERY_SESSION_MAX 限制，避免長時間佔用共享連接池
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from .connection import get_connection, close_connection
+from .metrics import register_gauge
+from .query_guard import check_query_cost, set_statement_timeout
+from .utils import quote_ident
+
+load_dotenv()
+
+# 同時開啟的工作階段上限（應小於 POSTGRES_POOL_MAX_SIZE）與閒置關閉秒數
+QUERY_SESSION_MAX = int(os.getenv("POSTGRES_QUERY_SESSION_MAX", "4"))
+QUERY_SESSION_IDLE_TTL = float(os.getenv("POSTGRES_QUERY_SESSION_IDLE_TTL", "60"))
+# 檢查閒置工作階段的間隔秒數
+SESSION_REAP_INTERVAL = max(1.0, min(QUERY_SESSION_IDLE_TTL / 4, 15.0))
+
+class QuerySession:
+    """持有專屬連接、唯讀交易與 SCROLL 游標的工作階段"""
+
+    def __init__(self, token: str, conn, transaction, cursor_name: str, query: str):
+        self.token = token
+        self.conn = conn
+        self.transaction = transaction
+        self.cursor_name = cursor_name
+        self.query = query
+        # 下一次 FETCH 的起始行（從 0 起算）
+        self.position = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.lock = asyncio.Lock()
+        self.closed = False
+
+    async def fetch(self, limit: int, offset: Optional[int] = None) -> List[Any]:
+        """
+        從游標讀取最多 limit 行
+        指定 offset 時先以 MOVE ABSOLUTE 移到該位置，可前後跳頁而不重新執行查詢
+        """
+        if offset is not None and offset != self.position:
+            # MOVE ABSOLUTE n 停在第 n 行上，下一次 FETCH FORWARD 從第 n + 1 行開始
+            await self.conn.execute(f"MOVE ABSOLUTE {int(offset)} FROM {self.cursor_name}")
+            self.position = offset
+        rows = await self.conn.fetch(f"FETCH FORWARD {int(limit)} FROM {self.cursor_name}")
+        self.position += len(rows)
+        self.last_used = time.monotonic()
+        return rows
+
+    async def close(self):
+        """回滾交易（同時關閉游標）並歸還連接"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.transaction.rollback()
+        except Exception:
+            pass
+        await close_connection(self.conn)
+
+    def info(self) -> Dict[str, Any]:
+        """工作階段摘要，游標代號即讀取憑證，只列出前綴且不包含查詢內容"""
+        now = time.monotonic()
+        return {
+            "cursor_prefix": self.token[:8],
+            "position": self.position,
+            "age": now - self.created_at,
+            "idle": now - self.last_used,
+        }
+
+_sessions: Dict[str, QuerySession] = {}
+# 已預留名額但尚未完成開啟的工作階段數
+_opening = 0
+_reaper: Optional[asyncio.Task] = None
+
+register_gauge("db_query_sessions", "目前開啟的查詢游標工作階段數", lambda: len(_sessions))
+
+async def _reap_idle_sessions():
+    """定期關閉閒置超過 QUERY_SESSION_IDLE_TTL 的工作階段，沒有工作階段時結束"""
+    global _reaper
+    try:
+        while _sessions:
+            await asyncio.sleep(SESSION_REAP_INTERVAL)
+            now = time.monotonic()
+            for token, session in list(_sessions.items()):
+                # 正在讀取的工作階段不關閉
+                if session.lock.locked() or now - session.last_used < QUERY_SESSION_IDLE_TTL:
+                    continue
+                async with session.lock:
+                    await discard_session(session)
+                print(f"✅ 查詢游標工作階段閒置逾時已關閉: {token[:8]}")
+    finally:
+        _reaper = None
+
+def _ensure_reaper():
+    global _reaper
+    if _reaper is None:
+        _reaper = asyncio.create_task(_reap_idle_sessions())
+
+async def open_session(query: str, params: Sequence[Any]) -> QuerySession:
+    """
+    取得專屬連接並宣告游標
+    已達 QUERY_SESSION_MAX 時回應 429；宣告前先做與一般查詢相同的成本檢查（不檢查估計行數）
+    """
+    global _opening
+
+    if len(_sessions) + _opening >= QUERY_SESSION_MAX:
+        raise HTTPException(
+            status_code=429,
+            detail=f"同時開啟的查詢游標已達上限 {QUERY_SESSION_MAX} 個，請關閉不再使用的游標或稍後再試"
+        )
+
+    _opening += 1
+    try:
+        conn = await get_connection()
+        transaction = conn.transaction(readonly=True)
+        try:
+            await transaction.start()
+            await set_statement_timeout(conn)
+            await check_query_cost(conn, query, params, check_rows=False)
+            token = secrets.token_urlsafe(16)
+            cursor_name = quote_ident(f"query_session_{token}")
+            await conn.execute(f"DECLARE {cursor_name} SCROLL CURSOR FOR {query}", *params)
+        except BaseException:
+            try:
+                await transaction.rollback()
+            except Exception:
+                pass
+            await close_connection(conn)
+            raise
+    finally:
+        _opening -= 1
+
+    session = QuerySession(token, conn, transaction, cursor_name, query)
+    _sessions[token] = session
+    _ensure_reaper()
+    return session
+
+def get_session(token: str) -> QuerySession:
+    """依游標代號取得工作階段，不存在或已關閉時回應 404"""
+    session = _sessions.get(token)
+    if session is None or session.closed:
+        raise HTTPException(status_code=404, detail="查詢游標不存在或已因閒置逾時關閉，請重新執行查詢")
+    return session
+
+async def discard_session(session: QuerySession):
+    """移除並關閉工作階段，呼叫端需已持有 session.lock"""
+    _sessions.pop(session.token, None)
+    await session.close()
+
+async def close_session(token: str) -> bool:
+    """關閉指定工作階段，返回是否存在"""
+    session = _sessions.get(token)
+    if session is None:
+        return False
+    async with session.lock:
+        await discard_session(session)
+    return True
+
+def list_sessions() -> List[Dict[str, Any]]:
+    return [session.info() for session in _sessions.values()]
+
+async def close_query_sessions():
+    """應用關閉時關閉所有工作階段"""
+    for token in list(_sessions):
+        try:
+            await close_session(token)
+        except Exception as e:
+            print(f"❌ 關閉查詢游標工作階段失敗: {e}")
+    if _reaper is not None:
+        _reaper.cancel()
@@ -0,0 +1,87 @@
+"""
+快速 JSON 回應模組
+以 orjson 直接編碼 asyncpg Record，跳過 FastAPI 的 jsonable_encoder 與逐行 Pydantic 驗證；
+date / datetime / UUID 由 orjson 原生處理，Decimal 轉為 float 與原本的回應格式一致。
+另提供欄式 (columnar) 與 Arrow IPC 輸出，直接由 Record 建立，不重複每行的欄位名稱
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence, Tuple
+
+import asyncpg
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+from .export import ArrowEncoder, arrow_available, infer_type_name
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def _default(value: Any):
+    """orjson 無法原生編碼的型別"""
+    if isinstance(value, asyncpg.Record):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+def dumps(content: Any) -> bytes:
+    """將回應內容編碼為 JSON 位元組"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+class FastJSONResponse(JSONResponse):
+    """
+    以 orjson 編碼的 JSON 回應
+    路由直接返回此回應時 FastAPI 不再執行 response_model 驗證，data 可直接放入 asyncpg Record
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def to_columnar(rows: Sequence) -> Tuple[List[str], Dict[str, List[Any]]]:
+    """將 Record / dict 列表轉為欄位名稱與 {欄位: 值陣列}"""
+    if not rows:
+        return [], {}
+    columns = list(rows[0].keys())
+    return columns, {column: [row[column] for row in rows] for column in columns}
+
+def rows_to_arrow(rows: Sequence, metadata: Dict[str, Any]) -> bytes:
+    """
+    以 Arrow IPC 串流格式編碼行資料，與串流匯出共用 ArrowEncoder 的型別對應
+    Record 不帶欄位型別，先依值對應 PostgreSQL 型別名稱，無法對應的欄位以字串輸出；
+    metadata 中的其他回應欄位以 JSON 字串寫入 schema metadata
+    """
+    if not arrow_available():
+        raise HTTPException(status_code=400, detail="伺服器未安裝 pyarrow，無法輸出 Arrow 格式")
+
+    columns, data = to_columnar(rows)
+    encoder = ArrowEncoder(
+        columns,
+        [infer_type_name(data[column]) for column in columns],
+        metadata={key: dumps(value) for key, value in metadata.items()}
+    )
+    body = encoder.header()
+    if rows:
+        body += encoder.encode([[row[column] for column in columns] for row in rows])
+    return body + encoder.footer()
+
+def format_rows_response(response: Dict[str, Any], response_format: str) -> Response:
+    """
+    依格式輸出 data 為行列表的回應
+    json: 原本的物件陣列；columnar: 加上 columns，data 改為 {欄位: 值陣列}；
+    arrow: data 以 Arrow IPC 輸出，其餘欄位放入 schema metadata
+    """
+    if response_format == "columnar":
+        columns, data = to_columnar(response["data"])
+        return FastJSONResponse({**response, "columns": columns, "data": data})
+    if response_format == "arrow":
+        metadata = {key: value for key, value in response.items() if key != "data"}
+        return Response(content=rows_to_arrow(response["data"], metadata), media_type=ARROW_MEDIA_TYPE)
+    return FastJSONResponse(response)
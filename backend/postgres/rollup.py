@@ -0,0 +1,349 @@
+"""
+產業每日彙總模組
+維護每個 (trade_date, market, industry_type) 的三大法人買賣超與價格統計彙總表，
+首次建立與產業對照前進時在背景依日期區間分批整批重建，之後只重算新到的交易日。
+分析端點改讀小型彙總表，不再每次掃描原始的法人與股價資料表；彙總落後最新交易日時改查原始資料表
+"""
+
+import asyncio
+import os
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from .analytics_cache import get_latest_trade_dates
+from .connection import acquire_connection
+from .industry import ensure_industry_index, get_industry_map_version
+
+load_dotenv()
+
+# 檢查來源資料表是否有新資料的最短間隔秒數
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("POSTGRES_ROLLUP_REFRESH_INTERVAL", "60"))
+# 整批回填每個區間涵蓋的天數與每個重算語句的逾時秒數
+ROLLUP_BACKFILL_CHUNK_DAYS = int(os.getenv("POSTGRES_ROLLUP_BACKFILL_CHUNK_DAYS", "90"))
+ROLLUP_STATEMENT_TIMEOUT = float(os.getenv("POSTGRES_ROLLUP_STATEMENT_TIMEOUT", "600"))
+
+CREATE_ROLLUP_TABLES = """
+    CREATE TABLE IF NOT EXISTS industry_insti_daily (
+        trade_date DATE NOT NULL,
+        market TEXT NOT NULL,
+        industry_type TEXT NOT NULL,
+        foreign_net_amount NUMERIC,
+        investment_trust_net_amount NUMERIC,
+        dealer_net_amount NUMERIC,
+        total_net_amount NUMERIC,
+        stock_count BIGINT NOT NULL,
+        PRIMARY KEY (trade_date, market, industry_type)
+    );
+    CREATE TABLE IF NOT EXISTS industry_price_daily (
+        trade_date DATE NOT NULL,
+        market TEXT NOT NULL,
+        industry_type TEXT NOT NULL,
+        stock_count BIGINT NOT NULL,
+        sum_open NUMERIC,
+        sum_close NUMERIC,
+        total_amount NUMERIC,
+        PRIMARY KEY (trade_date, market, industry_type)
+    );
+    CREATE TABLE IF NOT EXISTS industry_rollup_state (
+        name TEXT PRIMARY KEY,
+        last_trade_date DATE,
+        last_date_rows BIGINT,
+        map_version TEXT,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+# 以交易鎖避免多個工作進程同時重算同一個彙總
+ROLLUP_LOCK = "SELECT pg_advisory_xact_lock(hashtext($1))"
+
+ROLLUP_STATE_QUERY = """
+    SELECT last_trade_date, last_date_rows, map_version
+    FROM industry_rollup_state
+    WHERE name = $1
+"""
+
+UPSERT_ROLLUP_STATE = """
+    INSERT INTO industry_rollup_state (name, last_trade_date, last_date_rows, map_version, refreshed_at)
+    VALUES ($1, $2, $3, $4, now())
+    ON CONFLICT (name) DO UPDATE
+    SET last_trade_date = EXCLUDED.last_trade_date,
+        last_date_rows = EXCLUDED.last_date_rows,
+        map_version = EXCLUDED.map_version,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# 各彙總的來源資料表、刪除與重算語句，重算 [$1, $2) 區間的交易日（NULL 表示不設起點 / 終點）
+ROLLUPS: Dict[str, Dict[str, str]] = {
+    "insti_tse": {
+        "source": "twse_stock_insti",
+        "delete": """
+            DELETE FROM industry_insti_daily
+            WHERE market = 'TSE' AND trade_date >= COALESCE($1::date, '-infinity'::date)
+            AND trade_date < COALESCE($2::date, 'infinity'::date)
+        """,
+        "insert": """
+            INSERT INTO industry_insti_daily (
+                trade_date, market, industry_type,
+                foreign_net_amount, investment_trust_net_amount, dealer_net_amount, total_net_amount, stock_count
+            )
+            SELECT
+                tsi.trade_date,
+                'TSE',
+                COALESCE(mr.industry_type, '未分類'),
+                SUM(tsi.foreign_excl_dealer_net + tsi.foreign_dealer_net),
+                SUM(tsi.investment_trust_net),
+                SUM(tsi.dealer_self_net + tsi.dealer_hedge_net),
+                SUM(tsi.total_net),
+                COUNT(DISTINCT tsi.stock_id)
+            FROM twse_stock_insti tsi
+            LEFT JOIN stock_industry_map mr ON tsi.stock_id = mr.stock_id
+            WHERE tsi.trade_date >= COALESCE($1::date, '-infinity'::date)
+            AND tsi.trade_date < COALESCE($2::date, 'infinity'::date)
+            AND tsi.stock_id NOT LIKE '00%'
+            GROUP BY tsi.trade_date, COALESCE(mr.industry_type, '未分類')
+        """,
+    },
+    "insti_tpex": {
+        "source": "tpex_stock_insti",
+        "delete": """
+            DELETE FROM industry_insti_daily
+            WHERE market = 'TPEX' AND trade_date >= COALESCE($1::date, '-infinity'::date)
+            AND trade_date < COALESCE($2::date, 'infinity'::date)
+        """,
+        "insert": """
+            INSERT INTO industry_insti_daily (
+                trade_date, market, industry_type,
+                foreign_net_amount, investment_trust_net_amount, dealer_net_amount, total_net_amount, stock_count
+            )
+            SELECT
+                tsi.trade_date,
+                'TPEX',
+                COALESCE(mr.industry_type, '未分類'),
+                SUM(tsi.foreign_net),
+                SUM(tsi.investment_trust_net),
+                SUM(tsi.dealer_net),
+                SUM(tsi.total_net),
+                COUNT(DISTINCT tsi.stock_id)
+            FROM tpex_stock_insti tsi
+            LEFT JOIN stock_industry_map mr ON tsi.stock_id = mr.stock_id
+            WHERE tsi.trade_date >= COALESCE($1::date, '-infinity'::date)
+            AND tsi.trade_date < COALESCE($2::date, 'infinity'::date)
+            AND tsi.stock_id NOT LIKE '00%'
+            GROUP BY tsi.trade_date, COALESCE(mr.industry_type, '未分類')
+        """,
+    },
+    "price": {
+        "source": "tw_stock_price",
+        "delete": """
+            DELETE FROM industry_price_daily
+            WHERE trade_date >= COALESCE($1::date, '-infinity'::date)
+            AND trade_date < COALESCE($2::date, 'infinity'::date)
+        """,
+        "insert": """
+            INSERT INTO industry_price_daily (
+                trade_date, market, industry_type, stock_count, sum_open, sum_close, total_amount
+            )
+            SELECT
+                sp.trade_date,
+                COALESCE(sp.market, '未分類'),
+                COALESCE(mr.industry_type, '未分類'),
+                COUNT(DISTINCT sp.stock_id),
+                SUM(sp.open),
+                SUM(sp.close),
+                SUM(sp.amount)
+            FROM tw_stock_price sp
+            LEFT JOIN stock_industry_map mr ON sp.stock_id = mr.stock_id
+            WHERE sp.trade_date >= COALESCE($1::date, '-infinity'::date)
+            AND sp.trade_date < COALESCE($2::date, 'infinity'::date)
+            AND sp.stock_id NOT LIKE '00%'
+            GROUP BY sp.trade_date, COALESCE(sp.market, '未分類'), COALESCE(mr.industry_type, '未分類')
+        """,
+    },
+}
+
+# 來源資料表 -> 彙總名稱
+SOURCE_ROLLUPS = {spec["source"]: name for name, spec in ROLLUPS.items()}
+
+# 整批回填時期間加上工作階段鎖，多個工作進程只有一個執行
+BACKFILL_TRY_LOCK = "SELECT pg_try_advisory_lock(hashtext($1))"
+BACKFILL_UNLOCK = "SELECT pg_advisory_unlock(hashtext($1))"
+
+# 彙總狀態
+# 各彙總在目前產業對照版本下已涵蓋到的最新交易日，整批回填中或尚未建立的彙總不在其中
+_covered: Dict[str, Any] = {}
+_backfills: Dict[str, asyncio.Task] = {}
+_last_checked: float = 0.0
+_last_failed: float = 0.0
+_lock = asyncio.Lock()
+_tables_created = False
+
+async def _source_rows(conn, source: str, trade_date) -> int:
+    """來源資料表在指定交易日的行數，用於偵測最新交易日是否仍在寫入"""
+    return await conn.fetchval(f"SELECT COUNT(*) FROM {source} WHERE trade_date = $1", trade_date)
+
+async def _backfill(name: str, spec: Dict[str, str], map_version: Optional[str]):
+    """
+    背景整批重建單一彙總
+    依 ROLLUP_BACKFILL_CHUNK_DAYS 將歷史切成多個日期區間，每個區間在各自的交易中重算，
+    每個語句以 ROLLUP_STATEMENT_TIMEOUT 為逾時，不受連接池預設的 command_timeout 限制；
+    完成前路由改查原始資料表
+    """
+    lock_key = f"backfill:{name}"
+    try:
+        async with acquire_connection() as conn:
+            if not await conn.fetchval(BACKFILL_TRY_LOCK, lock_key):
+                # 其他工作進程正在回填，下一個檢查間隔再確認狀態
+                return
+            try:
+                start_time = time.time()
+                bounds = await conn.fetchrow(f"SELECT MIN(trade_date) as first, MAX(trade_date) as last FROM {spec['source']}")
+                chunk_start = bounds["first"]
+                chunks = 0
+                while True:
+                    chunk_end = chunk_start + timedelta(days=ROLLUP_BACKFILL_CHUNK_DAYS) if chunk_start is not None else None
+                    # 第一個區間不設起點以清除舊資料，最後一個區間不設終點以納入回填期間新寫入的交易日
+                    last_chunk = chunk_end is None or chunk_end > bounds["last"]
+                    async with conn.transaction():
+                        await conn.execute(ROLLUP_LOCK, name)
+                        args = (None if chunks == 0 else chunk_start, None if last_chunk else chunk_end)
+                        await conn.execute(spec["delete"], *args, timeout=ROLLUP_STATEMENT_TIMEOUT)
+                        await conn.execute(spec["insert"], *args, timeout=ROLLUP_STATEMENT_TIMEOUT)
+                    chunks += 1
+                    if last_chunk:
+                        break
+                    chunk_start = chunk_end
+
+                latest_rows = await _source_rows(conn, spec["source"], bounds["last"]) if bounds["last"] is not None else 0
+                await conn.execute(UPSERT_ROLLUP_STATE, name, bounds["last"], latest_rows, map_version)
+                if bounds["last"] is not None:
+                    _covered[name] = bounds["last"]
+                print(f"✅ 產業彙總 {name} 全量回填完成，共 {chunks} 個區間，耗時 {time.time() - start_time:.2f} 秒")
+            finally:
+                await conn.fetchval(BACKFILL_UNLOCK, lock_key)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"❌ 產業彙總 {name} 全量回填失敗: {e}")
+    finally:
+        _backfills.pop(name, None)
+
+def _schedule_backfill(name: str, spec: Dict[str, str], map_version: Optional[str]):
+    """彙總不再可用，改由背景工作整批重建"""
+    _covered.pop(name, None)
+    if name not in _backfills:
+        _backfills[name] = asyncio.create_task(_backfill(name, spec, map_version))
+
+async def _refresh_rollup(conn, name: str, spec: Dict[str, str], source_latest, map_version: Optional[str]):
+    """
+    更新單一彙總
+    產業對照版本不同或尚未建立時排入背景整批回填，否則只在最新交易日前進或其行數變動時重算最近的交易日
+    """
+    if source_latest is None:
+        return
+
+    async with conn.transaction():
+        await conn.execute(ROLLUP_LOCK, name)
+        state = await conn.fetchrow(ROLLUP_STATE_QUERY, name)
+
+        if state is None or state["last_trade_date"] is None or state["map_version"] != map_version:
+            _schedule_backfill(name, spec, map_version)
+            return
+
+        latest_rows = await _source_rows(conn, spec["source"], source_latest)
+        if source_latest > state["last_trade_date"]:
+            # 前一次的最新交易日可能只寫入一部分，一併重算
+            since = state["last_trade_date"]
+        elif source_latest == state["last_trade_date"] and latest_rows != state["last_date_rows"]:
+            since = source_latest
+        else:
+            _covered[name] = state["last_trade_date"]
+            return
+
+        start_time = time.time()
+        await conn.execute(spec["delete"], since, None, timeout=ROLLUP_STATEMENT_TIMEOUT)
+        await conn.execute(spec["insert"], since, None, timeout=ROLLUP_STATEMENT_TIMEOUT)
+        await conn.execute(UPSERT_ROLLUP_STATE, name, source_latest, latest_rows, map_version)
+        print(f"✅ 產業彙總 {name} 自 {since} 起重算完成，耗時 {time.time() - start_time:.2f} 秒")
+
+    _covered[name] = source_latest
+
+async def _refresh_all():
+    """依序更新所有彙總，整批回填中的彙總略過"""
+    global _tables_created
+
+    latest = await get_latest_trade_dates()
+    map_version = get_industry_map_version()
+
+    async with acquire_connection() as conn:
+        if not _tables_created:
+            await conn.execute(CREATE_ROLLUP_TABLES)
+            _tables_created = True
+        for name, spec in ROLLUPS.items():
+            if name in _backfills:
+                continue
+            await _refresh_rollup(conn, name, spec, latest[spec["source"]], map_version)
+
+def _lagging(sources: Tuple[str, ...], latest: Dict[str, Any]) -> List[str]:
+    """尚未涵蓋來源資料表最新交易日的彙總"""
+    lagging = []
+    for source in sources:
+        name = SOURCE_ROLLUPS[source]
+        if latest[source] is None:
+            continue
+        covered = _covered.get(name)
+        if covered is None or covered < latest[source]:
+            lagging.append(name)
+    return lagging
+
+def industry_rollups_ready(sources: Tuple[str, ...]) -> bool:
+    """來源資料表對應的彙總是否已建立（可能仍落後最新交易日）"""
+    return all(SOURCE_ROLLUPS[source] in _covered for source in sources)
+
+async def ensure_industry_rollups(sources: Tuple[str, ...] = (), force: bool = False) -> bool:
+    """
+    確保彙總表為最新，返回 sources 對應的彙總是否已涵蓋各來源資料表的最新交易日
+    距上次檢查超過 ROLLUP_REFRESH_INTERVAL 秒，或來源出現彙總尚未涵蓋的新交易日時立即更新；
+    返回 False 時（整批回填中、更新失敗或正由其他請求更新）呼叫端改用原始查詢，不讀取落後的彙總
+    """
+    global _last_checked, _last_failed
+
+    try:
+        latest = await get_latest_trade_dates()
+    except Exception as e:
+        # 無法取得最新交易日（例如資料庫無法連線）時視為落後，呼叫端改用原始查詢
+        print(f"❌ 產業彙總檢查最新交易日失敗: {e}")
+        return False
+    now = time.monotonic()
+    due = force or now - _last_checked >= ROLLUP_REFRESH_INTERVAL
+    lagging = [name for name in _lagging(sources, latest) if name not in _backfills]
+    retry = lagging and now - _last_failed >= ROLLUP_REFRESH_INTERVAL
+
+    # 其他請求正在更新時不排隊等待
+    if (due or retry) and (force or not _lock.locked()):
+        async with _lock:
+            now = time.monotonic()
+            if force or now - _last_checked >= ROLLUP_REFRESH_INTERVAL or _lagging(sources, latest):
+                try:
+                    await ensure_industry_index()
+                    await _refresh_all()
+                except Exception as e:
+                    print(f"❌ 產業彙總更新失敗: {e}")
+                    _last_failed = time.monotonic()
+                _last_checked = time.monotonic()
+
+    return not _lagging(sources, latest)
+
+async def init_industry_rollups():
+    """應用啟動時建立彙總表，需要整批回填的彙總在背景執行"""
+    try:
+        await ensure_industry_rollups(force=True)
+    except Exception as e:
+        print(f"❌ 產業彙總表初始化失敗: {e}")
+
+async def stop_industry_rollups():
+    """應用關閉時取消進行中的整批回填"""
+    for task in list(_backfills.values()):
+        task.cancel()
+    await asyncio.gather(*_backfills.values(), return_exceptions=True)
@@ -2,12 +2,77 @@
 PostgreSQL 相關的 API 路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple
 import time
 import asyncpg
 from datetime import datetime
-from .connection import get_connection, close_connection, test_connection
+from .connection import get_connection, close_connection, test_connection, run_concurrent_queries, get_pool_stats
+from .row_counts import get_row_counts
+from .industry import ensure_industry_index
+from .rollup import ensure_industry_rollups, industry_rollups_ready
+from .analytics_cache import analytics_cache
+from .statements import run_statement, get_statement_stats, open_statement_cursor
+from .queries import (
+    TSE_INDUSTRY_TRADING,
+    TPEX_INDUSTRY_TRADING,
+    TSE_INDUSTRY_DETAILS,
+    TPEX_INDUSTRY_DETAILS,
+    INDUSTRY_ANALYSIS,
+    ROLLUP_INDUSTRY_TRADING,
+    ROLLUP_INDUSTRY_ANALYSIS,
+    INDUSTRY_FLOW_TRENDS,
+    LATEST_TRADE_DATE
+)
+from .batch import normalize_records, write_batches
+from .responses import FastJSONResponse, format_rows_response, to_columnar
+from .conditional import NO_STORE_HEADERS, check_not_modified, with_headers
+from .search import get_stock_search_index
+from .query_cache import parse_cache_control, query_cache, resolve_ttl
+from .query_session import (
+    QUERY_SESSION_IDLE_TTL,
+    QUERY_SESSION_MAX,
+    QuerySession,
+    close_session,
+    discard_session,
+    get_session,
+    list_sessions,
+    open_session
+)
+from .query_guard import (
+    check_query_cost,
+    clear_slow_queries,
+    explain_query,
+    get_limits,
+    get_slow_queries,
+    is_timeout,
+    plan_estimates,
+    plan_violations,
+    record_slow_query,
+    set_statement_timeout,
+    timeout_error
+)
+from .export import EXPORT_ENCODERS, EXPORT_MEDIA_TYPES, STREAM_CHUNK_SIZE, STREAM_MAX_ROWS, arrow_available, stream_cursor
+from .chart import (
+    CHART_INTERVALS,
+    CHART_BATCH_MAX_IDS,
+    DAILY_CHART_QUERY,
+    RESAMPLED_CHART_QUERY,
+    BATCH_DAILY_CHART_QUERY,
+    BATCH_RESAMPLED_CHART_QUERY,
+    downsample_ohlcv,
+    group_by_stock,
+    parse_stock_ids
+)
+from .indicators import (
+    LAST_TRADE_DATE_QUERY,
+    INDICATOR_SERIES_QUERY,
+    compute_indicators,
+    get_cached_indicators,
+    set_cached_indicators,
+    slice_indicators
+)
 from .models import (
     PostgresConnectionTest,
     DatabaseInfo,
@@ -17,74 +82,131 @@ from .models import (
     QueryResult,
     CreateTableRequest,
     InsertDataRequest,
+    BatchInsertRequest,
     UpdateDataRequest,
     DeleteDataRequest,
-    CustomQueryRequest
+    CustomQueryRequest,
+    StreamQueryRequest,
+    ExportFormat,
+    ResponseFormat,
+    StreamableResponseFormat
 )
 
 postgres_router = APIRouter(prefix="/postgres", tags=["PostgreSQL"])
 
+def _parse_date_param(date: Optional[str]):
+    """解析 YYYY-MM-DD 日期參數，空值返回 None"""
+    if not date:
+        return None
+    try:
+        return datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
+
+def _format_grouped_response(response: Dict[str, Any], response_format: ResponseFormat, group_column: str):
+    """
+    依格式輸出 data 為 {分組: 行列表} 的回應
+    columnar 時每個分組各自轉為欄式，arrow 時合併為一個表並以 group_column 欄位標示分組
+    """
+    if response_format == ResponseFormat.COLUMNAR:
+        data = {}
+        for group, rows in response["data"].items():
+            columns, values = to_columnar(rows)
+            data[group] = {"columns": columns, "data": values}
+        return FastJSONResponse({**response, "data": data})
+    if response_format == ResponseFormat.ARROW:
+        rows = [
+            {group_column: group, **dict(row)}
+            for group, group_rows in response["data"].items()
+            for row in group_rows
+        ]
+        return format_rows_response({**response, "data": rows}, response_format.value)
+    return FastJSONResponse(response)
+
+def _validate_read_only_query(query: str) -> str:
+    """檢查自定義查詢是否為 SELECT 或 WITH 開頭，返回去除空白後的查詢"""
+    query = query.strip()
+    query_upper = query.upper()
+    if not (query_upper.startswith('SELECT') or query_upper.startswith('WITH')):
+        raise HTTPException(status_code=400, detail="只允許執行 SELECT 或 WITH 查詢")
+    return query
+
 @postgres_router.get("/test", response_model=PostgresConnectionTest)
 async def test_postgres_connection():
     """測試 PostgreSQL 連接"""
     return await test_connection()
 
+@postgres_router.get("/pool")
+async def get_pool_status():
+    """獲取連接池狀態"""
+    return {
+        "success": True,
+        "message": "獲取連接池狀態成功",
+        "data": get_pool_stats()
+    }
+
 @postgres_router.get("/info", response_model=DatabaseInfo)
-async def get_database_info():
+async def get_database_info(
+    count_mode: str = Query("estimate", pattern="^(estimate|exact)$", description="行數統計方式: estimate 使用系統目錄估計值 / exact 執行 COUNT(*)")
+):
     """獲取資料庫基本信息"""
     try:
-        conn = await get_connection()
-        try:
-            # 獲取資料庫版本
-            version = await conn.fetchval("SELECT version()")
-            
-            # 獲取當前用戶和資料庫
-            current_user = await conn.fetchval("SELECT current_user")
-            current_database = await conn.fetchval("SELECT current_database()")
-            
-            # 獲取所有資料表
-            tables_query = """
-                SELECT 
-                    table_name,
-                    table_schema,
-                    'BASE TABLE' as table_type
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """
-            tables_data = await conn.fetch(tables_query)
-            
-            tables = []
-            for table in tables_data:
-                # 獲取每個表的行數
-                try:
-                    row_count = await conn.fetchval(f"SELECT COUNT(*) FROM {table['table_name']}")
-                except:
-                    row_count = None
-                
-                tables.append(TableInfo(
-                    table_name=table['table_name'],
-                    table_schema=table['table_schema'],
-                    table_type=table['table_type'],
-                    row_count=row_count
-                ))
-            
-            return DatabaseInfo(
-                database_name=current_database,
-                database_version=version,
-                current_user=current_user,
-                current_database=current_database,
-                tables=tables
-            )
-            
-        finally:
-            await close_connection(conn)
+        # 獲取所有資料表
+        tables_query = """
+            SELECT 
+                table_name,
+                table_schema,
+                'BASE TABLE' as table_type
+            FROM information_schema.tables 
+            WHERE table_schema = 'public'
+            ORDER BY table_name
+        """
+        
+        # 資料庫版本、當前用戶與資料表列表同時查詢
+        results, errors = await run_concurrent_queries({
+            "meta": {
+                "query": "SELECT version() as version, current_user as current_user, current_database() as current_database",
+                "method": "fetchrow"
+            },
+            "tables": {"query": tables_query}
+        })
+        if errors:
+            raise HTTPException(status_code=500, detail=f"獲取資料庫信息失敗: {errors}")
+        
+        meta = results["meta"]
+        tables_data = results["tables"]
+        
+        # 一次取得所有資料表的行數，精確計數時由 get_row_counts 以多個連接並行執行
+        exact = count_mode == "exact"
+        row_counts = await get_row_counts([table['table_name'] for table in tables_data], exact=exact)
+        
+        tables = []
+        for table in tables_data:
+            tables.append(TableInfo(
+                table_name=table['table_name'],
+                table_schema=table['table_schema'],
+                table_type=table['table_type'],
+                row_count=row_counts.get(table['table_name']),
+                row_count_estimated=not exact
+            ))
+        
+        return DatabaseInfo(
+            database_name=meta['current_database'],
+            database_version=meta['version'],
+            current_user=meta['current_user'],
+            current_database=meta['current_database'],
+            tables=tables
+        )
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取資料庫信息失敗: {str(e)}")
 
 @postgres_router.get("/tables", response_model=List[TableInfo])
-async def get_tables():
+async def get_tables(
+    count_mode: str = Query("estimate", pattern="^(estimate|exact)$", description="行數統計方式: estimate 使用系統目錄估計值 / exact 執行 COUNT(*)")
+):
     """獲取所有資料表列表"""
     try:
         conn = await get_connection()
@@ -100,25 +222,27 @@ async def get_tables():
             """
             tables_data = await conn.fetch(query)
             
-            tables = []
-            for table in tables_data:
-                try:
-                    row_count = await conn.fetchval(f"SELECT COUNT(*) FROM {table['table_name']}")
-                except:
-                    row_count = None
-                
-                tables.append(TableInfo(
-                    table_name=table['table_name'],
-                    table_schema=table['table_schema'],
-                    table_type=table['table_type'],
-                    row_count=row_count
-                ))
-            
-            return tables
-            
         finally:
             await close_connection(conn)
+        
+        # 先歸還連接再取得行數，精確計數時由 get_row_counts 以多個連接並行執行
+        exact = count_mode == "exact"
+        row_counts = await get_row_counts([table['table_name'] for table in tables_data], exact=exact)
+        
+        tables = []
+        for table in tables_data:
+            tables.append(TableInfo(
+                table_name=table['table_name'],
+                table_schema=table['table_schema'],
+                table_type=table['table_type'],
+                row_count=row_counts.get(table['table_name']),
+                row_count_estimated=not exact
+            ))
+        
+        return tables
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取資料表列表失敗: {str(e)}")
 
@@ -192,45 +316,203 @@ async def get_table_detail(table_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取資料表詳細信息失敗: {str(e)}")
 
+def _paged_query(request: CustomQueryRequest) -> str:
+    """檢查自定義查詢並在未指定時加上 LIMIT 與 OFFSET"""
+    query = _validate_read_only_query(request.query)
+    
+    if 'LIMIT' not in query.upper():
+        query += f" LIMIT {request.limit}"
+    if 'OFFSET' not in query.upper():
+        query += f" OFFSET {request.offset}"
+    return query
+
 @postgres_router.post("/query", response_model=QueryResult)
-async def execute_custom_query(request: CustomQueryRequest):
-    """執行自定義 SQL 查詢"""
+async def execute_custom_query(request: CustomQueryRequest, http_request: Request):
+    """
+    執行自定義 SQL 查詢
+    先以 EXPLAIN 檢查估計成本與行數，再於唯讀交易中以 statement_timeout 執行；
+    cache 為 true 時先查結果快取，請求帶 Cache-Control: no-cache 時略過快取重新查詢
+    """
+    if request.session:
+        return await _open_query_session(request)
+    
     try:
+        start_time = time.time()
+        
+        # 添加 LIMIT 和 OFFSET
+        query = _paged_query(request)
+        params = request.params or []
+        
+        cache_status = None
+        cache_age = None
+        if request.cache:
+            cache_key = query_cache.make_key(query, params, request.limit, request.offset)
+            skip_lookup, store = parse_cache_control(http_request.headers.get("cache-control"))
+            if skip_lookup:
+                query_cache.bypasses += 1
+                cache_status = "BYPASS"
+            else:
+                cached = query_cache.get(cache_key)
+                if cached is not None:
+                    rows, cache_age = cached
+                    return format_rows_response({
+                        "success": True,
+                        "message": f"查詢執行成功，返回 {len(rows)} 行數據（快取）",
+                        "data": rows,
+                        "row_count": len(rows),
+                        "execution_time": time.time() - start_time,
+                        "cache_status": "HIT",
+                        "cache_age": cache_age
+                    }, request.format.value)
+                cache_status = "MISS"
+        
         conn = await get_connection()
         try:
-            start_time = time.time()
+            plan = None
+            query_start = None
+            try:
+                async with conn.transaction(readonly=True):
+                    await set_statement_timeout(conn)
+                    plan = await check_query_cost(conn, query, params)
+                    query_start = time.time()
+                    rows = await conn.fetch(query, *params)
+            except Exception as e:
+                # 被 statement_timeout 取消的查詢同樣記入慢查詢日誌，附上執行前的估計計畫
+                if query_start is not None and is_timeout(e):
+                    record_slow_query(query, params, time.time() - query_start, plan, None, timed_out=True)
+                raise
             
-            # 添加 LIMIT 和 OFFSET
-            query = request.query.strip()
-            query_upper = query.upper()
-            if not (query_upper.startswith('SELECT') or query_upper.startswith('WITH')):
-                raise HTTPException(status_code=400, detail="只允許執行 SELECT 或 WITH 查詢")
+            execution_time = time.time() - start_time
+            record_slow_query(query, params, time.time() - query_start, plan, len(rows))
             
-            if 'LIMIT' not in query.upper():
-                query += f" LIMIT {request.limit}"
-            if 'OFFSET' not in query.upper():
-                query += f" OFFSET {request.offset}"
+            # Record 直接交由 orjson 編碼，不逐行建立 dict 與 Pydantic 模型
+            response = format_rows_response({
+                "success": True,
+                "message": f"查詢執行成功，返回 {len(rows)} 行數據",
+                "data": rows,
+                "row_count": len(rows),
+                "execution_time": execution_time,
+                "cache_status": cache_status,
+                "cache_age": cache_age
+            }, request.format.value)
+            
+            if request.cache and store:
+                query_cache.set(cache_key, rows, resolve_ttl(request.cache_ttl), len(response.body))
+            return response
             
-            # 執行查詢
-            if request.params:
-                rows = await conn.fetch(query, *request.params)
-            else:
-                rows = await conn.fetch(query)
+        finally:
+            await close_connection(conn)
             
-            # 轉換結果
-            data = []
-            for row in rows:
-                data.append(dict(row))
+    except HTTPException:
+        raise
+    except Exception as e:
+        if is_timeout(e):
+            raise timeout_error()
+        raise HTTPException(status_code=500, detail=f"查詢執行失敗: {str(e)}")
+
+async def _session_page(session: QuerySession, limit: int, offset: Optional[int], response_format: str, start_time: float):
+    """讀取工作階段的一頁，讀完或出錯時關閉工作階段"""
+    async with session.lock:
+        if session.closed:
+            raise HTTPException(status_code=404, detail="查詢游標不存在或已因閒置逾時關閉，請重新執行查詢")
+        try:
+            rows = await session.fetch(limit, offset)
+        except Exception:
+            await discard_session(session)
+            raise
+        
+        has_more = len(rows) == limit
+        if not has_more:
+            await discard_session(session)
+    
+    return format_rows_response({
+        "success": True,
+        "message": f"查詢執行成功，返回 {len(rows)} 行數據",
+        "data": rows,
+        "row_count": len(rows),
+        "execution_time": time.time() - start_time,
+        "cursor": session.token if has_more else None,
+        "has_more": has_more,
+        "position": session.position
+    }, response_format)
+
+async def _open_query_session(request: CustomQueryRequest):
+    """開啟游標工作階段並返回第一頁，查詢本身不加 LIMIT / OFFSET"""
+    try:
+        start_time = time.time()
+        query = _validate_read_only_query(request.query).rstrip(';')
+        session = await open_session(query, request.params or [])
+        return await _session_page(session, request.limit, request.offset or None, request.format.value, start_time)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        if is_timeout(e):
+            raise timeout_error()
+        raise HTTPException(status_code=500, detail=f"查詢執行失敗: {str(e)}")
+
+@postgres_router.get("/query/sessions")
+async def get_query_sessions():
+    """目前開啟的查詢游標工作階段"""
+    sessions = list_sessions()
+    return {
+        "success": True,
+        "message": f"目前開啟 {len(sessions)} 個查詢游標",
+        "data": sessions,
+        "max_sessions": QUERY_SESSION_MAX,
+        "idle_ttl": QUERY_SESSION_IDLE_TTL
+    }
+
+@postgres_router.get("/query/sessions/{cursor}", response_model=QueryResult)
+async def fetch_query_session(
+    cursor: str,
+    limit: int = Query(100, ge=1, le=100000, description="本頁行數"),
+    offset: Optional[int] = Query(None, ge=0, description="從第幾行開始（從 0 起算），未指定時接續上一頁"),
+    format: ResponseFormat = Query(ResponseFormat.JSON, description="回應格式: json / columnar / arrow")
+):
+    """以 FETCH 從游標工作階段讀取下一頁"""
+    try:
+        start_time = time.time()
+        return await _session_page(get_session(cursor), limit, offset, format.value, start_time)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        if is_timeout(e):
+            raise timeout_error()
+        raise HTTPException(status_code=500, detail=f"讀取查詢游標失敗: {str(e)}")
+
+@postgres_router.delete("/query/sessions/{cursor}")
+async def delete_query_session(cursor: str):
+    """關閉游標工作階段並歸還連接"""
+    if not await close_session(cursor):
+        raise HTTPException(status_code=404, detail="查詢游標不存在或已關閉")
+    return {"success": True, "message": "查詢游標已關閉"}
+
+@postgres_router.post("/query/explain")
+async def explain_custom_query(request: CustomQueryRequest):
+    """返回自定義查詢的估計執行計畫與是否超過成本上限，不實際執行查詢"""
+    try:
+        conn = await get_connection()
+        try:
+            query = _paged_query(request)
             
-            execution_time = time.time() - start_time
+            async with conn.transaction(readonly=True):
+                await set_statement_timeout(conn)
+                plan = await explain_query(conn, query, request.params or [])
             
-            return QueryResult(
-                success=True,
-                message=f"查詢執行成功，返回 {len(data)} 行數據",
-                data=data,
-                row_count=len(data),
-                execution_time=execution_time
-            )
+            estimates = plan_estimates(plan)
+            violations = plan_violations(estimates)
+            return FastJSONResponse({
+                "success": True,
+                "message": "查詢可執行" if not violations else f"查詢將被拒絕：{'；'.join(violations)}",
+                "query": query,
+                "data": plan,
+                "estimates": estimates,
+                "allowed": not violations,
+                "violations": violations,
+                "limits": get_limits()
+            })
             
         finally:
             await close_connection(conn)
@@ -238,7 +520,84 @@ async def execute_custom_query(request: CustomQueryRequest):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"查詢執行失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"取得查詢計畫失敗: {str(e)}")
+
+@postgres_router.get("/query/slow-log")
+async def get_slow_query_log(
+    limit: int = Query(20, ge=1, le=1000, description="返回筆數")
+):
+    """最近的慢查詢與其估計 / 實際執行計畫（EXPLAIN ANALYZE, BUFFERS 於背景擷取，可能稍後才出現）"""
+    entries = get_slow_queries(limit)
+    return FastJSONResponse({
+        "success": True,
+        "message": f"獲取 {len(entries)} 筆慢查詢紀錄",
+        "data": entries,
+        "limits": get_limits()
+    })
+
+@postgres_router.delete("/query/slow-log")
+async def clear_slow_query_log():
+    """清除慢查詢日誌"""
+    clear_slow_queries()
+    return {"success": True, "message": "慢查詢日誌已清除"}
+
+async def _cursor_stream(
+    open_cursor: Callable[[Any], Awaitable[Tuple[Any, Any]]],
+    export_format: str,
+    max_rows: int,
+    error_detail: str,
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    在唯讀交易中設定 statement_timeout 後以 open_cursor(conn) 開啟游標，串流輸出 (NDJSON / CSV / Arrow IPC)
+    open_cursor 返回 (欄位屬性, 游標)；開啟失敗時回滾交易並歸還連接，逾時回應 408
+    """
+    conn = await get_connection()
+    transaction = conn.transaction(readonly=True)
+    try:
+        # 游標必須在交易中使用
+        await transaction.start()
+        await set_statement_timeout(conn)
+        attributes, cursor = await open_cursor(conn)
+        encoder = EXPORT_ENCODERS[export_format](
+            [attr.name for attr in attributes],
+            [attr.type.name for attr in attributes]
+        )
+    except Exception as e:
+        try:
+            await transaction.rollback()
+        except Exception:
+            pass
+        await close_connection(conn)
+        if isinstance(e, HTTPException):
+            raise
+        if is_timeout(e):
+            raise timeout_error()
+        raise HTTPException(status_code=500, detail=f"{error_detail}: {str(e)}")
+    
+    return StreamingResponse(
+        stream_cursor(conn, transaction, cursor, encoder, max_rows, STREAM_CHUNK_SIZE),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=headers
+    )
+
+@postgres_router.post("/query/stream")
+async def stream_custom_query(request: StreamQueryRequest):
+    """以伺服器端游標串流匯出自定義查詢結果 (NDJSON / CSV / Arrow IPC)"""
+    query = _validate_read_only_query(request.query).rstrip(';')
+    params = request.params or []
+    max_rows = min(request.max_rows or STREAM_MAX_ROWS, STREAM_MAX_ROWS)
+    if request.format == ExportFormat.ARROW and not arrow_available():
+        raise HTTPException(status_code=400, detail="伺服器未安裝 pyarrow，無法輸出 Arrow 格式")
+    
+    async def open_cursor(conn):
+        await check_query_cost(conn, query, params, check_rows=False)
+        statement = await conn.prepare(query)
+        return statement.get_attributes(), await statement.cursor(*params)
+    
+    return await _cursor_stream(
+        open_cursor, request.format.value, max_rows, "查詢執行失敗", headers={"X-Max-Rows": str(max_rows)}
+    )
 
 @postgres_router.post("/tables/create")
 async def create_table(request: CreateTableRequest):
@@ -269,6 +628,8 @@ async def create_table(request: CreateTableRequest):
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"創建資料表失敗: {str(e)}")
 
@@ -290,6 +651,7 @@ async def insert_data(table_name: str, request: InsertDataRequest):
             """
             
             await conn.execute(insert_sql, *values)
+            query_cache.clear()
             
             return {
                 "success": True,
@@ -301,9 +663,64 @@ async def insert_data(table_name: str, request: InsertDataRequest):
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"插入數據失敗: {str(e)}")
 
+@postgres_router.post("/tables/{table_name}/insert/batch")
+async def insert_data_batch(table_name: str, request: BatchInsertRequest):
+    """批次插入數據，指定 conflict_columns 時進行 upsert，所有批次在同一個交易中完成"""
+    if (request.records is None) == (request.columns is None):
+        raise HTTPException(status_code=400, detail="records 與 columns 必須擇一提供")
+    
+    try:
+        columns, rows = normalize_records(request.records, request.columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not columns or not rows:
+        raise HTTPException(status_code=400, detail="沒有可插入的數據")
+    
+    try:
+        conn = await get_connection()
+        try:
+            start_time = time.time()
+            
+            batches = await write_batches(
+                conn,
+                request.schema_name,
+                table_name,
+                columns,
+                rows,
+                request.batch_size,
+                conflict_columns=request.conflict_columns,
+                update_columns=request.update_columns
+            )
+            
+            execution_time = time.time() - start_time
+            query_cache.clear()
+            
+            return {
+                "success": True,
+                "message": f"批次寫入 {table_name} 成功，共 {len(rows)} 行",
+                "table_name": table_name,
+                "mode": "upsert" if request.conflict_columns else "copy",
+                "row_count": len(rows),
+                "written_count": sum(batch["written"] for batch in batches),
+                "batches": batches,
+                "execution_time": execution_time
+            }
+            
+        finally:
+            await close_connection(conn)
+            
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批次寫入數據失敗: {str(e)}")
+
 @postgres_router.put("/tables/{table_name}/update")
 async def update_data(table_name: str, request: UpdateDataRequest):
     """更新資料表中的數據"""
@@ -331,6 +748,7 @@ async def update_data(table_name: str, request: UpdateDataRequest):
             """
             
             result = await conn.execute(update_sql, *values)
+            query_cache.clear()
             
             return {
                 "success": True,
@@ -343,6 +761,8 @@ async def update_data(table_name: str, request: UpdateDataRequest):
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新數據失敗: {str(e)}")
 
@@ -358,6 +778,7 @@ async def delete_data(table_name: str, request: DeleteDataRequest):
             """
             
             result = await conn.execute(delete_sql)
+            query_cache.clear()
             
             return {
                 "success": True,
@@ -369,255 +790,236 @@ async def delete_data(table_name: str, request: DeleteDataRequest):
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"刪除數據失敗: {str(e)}")
 
 @postgres_router.get("/institutional-trading/top-industries")
-async def get_top_institutional_trading_industries(date: Optional[str] = Query(None, description="查詢日期 (YYYY-MM-DD)")):
+async def get_top_institutional_trading_industries(
+    request: Request,
+    date: Optional[str] = Query(None, description="查詢日期 (YYYY-MM-DD)"),
+    format: ResponseFormat = Query(ResponseFormat.JSON, description="回應格式: json / columnar / arrow")
+):
     """獲取上市櫃三大法人買賣超產業及金額"""
+    try:
+        # 處理日期參數
+        date_param = _parse_date_param(date)
+        
+        # 確保產業對照索引為最新
+        await ensure_industry_index()
+        
+        # 資料未更新時直接回應 304
+        not_modified, headers = await check_not_modified(
+            request, "top-industries", (date_param, format.value), ("twse_stock_insti", "tpex_stock_insti")
+        )
+        if not_modified is not None:
+            return not_modified
+        
+        # 以解析後的交易日期查詢快取
+        cached, cache_key = await analytics_cache.lookup(
+            "top-industries", (), date_param, ("twse_stock_insti", "tpex_stock_insti")
+        )
+        if cached is not None:
+            return with_headers(_format_grouped_response(cached, format, "market"), headers)
+
+        # 上市與上櫃查詢互不相依，分別在不同連接上同時執行；彙總表不可用或落後最新交易日時改查原始資料表
+        if await ensure_industry_rollups(("twse_stock_insti", "tpex_stock_insti")):
+            queries = {
+                "tse": {"statement": ROLLUP_INDUSTRY_TRADING, "args": ["TSE", date_param]},
+                "tpex": {"statement": ROLLUP_INDUSTRY_TRADING, "args": ["TPEX", date_param]}
+            }
+        else:
+            queries = {
+                "tse": {"statement": TSE_INDUSTRY_TRADING, "args": [date_param]},
+                "tpex": {"statement": TPEX_INDUSTRY_TRADING, "args": [date_param]}
+            }
+        results, errors = await run_concurrent_queries(queries)
+        if not results:
+            raise HTTPException(status_code=500, detail=f"獲取三大法人買賣超產業失敗: {errors}")
+        
+        response = {
+            "success": True,
+            "message": "獲取三大法人買賣超產業成功" if not errors else "部分市場的三大法人買賣超產業獲取失敗",
+            "data": {
+                "tse": results.get("tse", []),
+                "tpex": results.get("tpex", [])
+            }
+        }
+        if errors:
+            # 部分結果不快取也不帶驗證標頭，避免客戶端以 304 沿用不完整的回應
+            response["errors"] = errors
+            return with_headers(_format_grouped_response(response, format, "market"), NO_STORE_HEADERS)
+        analytics_cache.store(cache_key, response)
+        return with_headers(_format_grouped_response(response, format, "market"), headers)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"獲取三大法人買賣超產業失敗: {str(e)}")
+
+@postgres_router.get("/institutional-trading/industry-trends")
+async def get_industry_flow_trends(
+    request: Request,
+    start: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
+    days: Optional[int] = Query(None, ge=1, le=1000, description="最多取區間內最近幾個交易日，未指定起始日期時預設 20"),
+    window: int = Query(5, ge=1, le=250, description="移動合計的交易日數"),
+    market: Optional[str] = Query(None, pattern="^(TSE|TPEX)$", description="市場篩選: TSE / TPEX，未指定時兩者皆返回"),
+    format: StreamableResponseFormat = Query(StreamableResponseFormat.JSON, description="回應格式: json / columnar / arrow / ndjson")
+):
+    """
+    獲取多日產業三大法人買賣超趨勢
+    每個 (交易日, 市場, 產業) 返回當日淨額、區間內累計淨額與最近 window 個交易日的移動合計，單一查詢完成
+    """
+    start_date = _parse_date_param(start)
+    end_date = _parse_date_param(end)
+    if start_date is None and days is None:
+        days = 20
+    markets = [market] if market else ["TSE", "TPEX"]
+    args = (markets, start_date, end_date, days, window)
+    
+    # 趨勢查詢只讀取彙總表
+    sources = ("twse_stock_insti", "tpex_stock_insti")
+    await ensure_industry_index()
+    current = await ensure_industry_rollups(sources)
+    if not industry_rollups_ready(sources):
+        raise HTTPException(status_code=503, detail="產業彙總表尚未就緒，請稍後再試")
+    
+    if current:
+        # 資料未更新時直接回應 304
+        not_modified, headers = await check_not_modified(
+            request, "industry-trends", (*args[1:], tuple(markets), format.value), sources
+        )
+        if not_modified is not None:
+            return not_modified
+    else:
+        # 彙總落後最新交易日，回應不帶驗證標頭，避免客戶端以 304 沿用落後的結果
+        headers = NO_STORE_HEADERS
+    
+    if format == StreamableResponseFormat.NDJSON:
+        # 以伺服器端游標逐批輸出
+        return await _cursor_stream(
+            lambda conn: open_statement_cursor(conn, INDUSTRY_FLOW_TRENDS, *args),
+            "ndjson", STREAM_MAX_ROWS, "獲取產業買賣超趨勢失敗", headers=headers
+        )
+    
     try:
         conn = await get_connection()
         try:
-            # 查詢上市三大法人買賣超產業
-            tse_query = """
-                WITH industry_trading AS (
-                    SELECT 
-                        COALESCE(mr.industry_type, '未分類') as industry_type,
-                        'TSE' as market,
-                        SUM(tsi.foreign_excl_dealer_net + tsi.foreign_dealer_net) as foreign_net_amount,
-                        SUM(tsi.investment_trust_net) as investment_trust_net_amount,
-                        SUM(tsi.dealer_self_net + tsi.dealer_hedge_net) as dealer_net_amount,
-                        SUM(tsi.total_net) as total_net_amount,
-                        COUNT(DISTINCT tsi.stock_id) as stock_count
-                    FROM twse_stock_insti tsi
-                    LEFT JOIN (
-                        SELECT DISTINCT ON (stock_id)
-                            stock_id, industry_type, report_month
-                        FROM monthly_revenue
-                        ORDER BY stock_id, report_month DESC
-                    ) mr ON tsi.stock_id = mr.stock_id
-                    WHERE tsi.trade_date = CASE 
-                        WHEN $1::date IS NOT NULL THEN $1::date 
-                        ELSE (SELECT MAX(trade_date) FROM twse_stock_insti) 
-                    END
-                    AND tsi.stock_id NOT LIKE '00%'
-                    GROUP BY COALESCE(mr.industry_type, '未分類')
-                )
-                SELECT 
-                    industry_type,
-                    market,
-                    foreign_net_amount,
-                    investment_trust_net_amount,
-                    dealer_net_amount,
-                    total_net_amount,
-                    stock_count,
-                    ROW_NUMBER() OVER (ORDER BY ABS(total_net_amount) DESC) as rank_in_market
-                FROM industry_trading
-                ORDER BY ABS(total_net_amount) DESC
-            """
+            rows = await run_statement(conn, INDUSTRY_FLOW_TRENDS, *args)
             
-            # 查詢上櫃三大法人買賣超產業
-            tpex_query = """
-                WITH industry_trading AS (
-                    SELECT 
-                        COALESCE(mr.industry_type, '未分類') as industry_type,
-                        'TPEX' as market,
-                        SUM(tsi.foreign_net) as foreign_net_amount,
-                        SUM(tsi.investment_trust_net) as investment_trust_net_amount,
-                        SUM(tsi.dealer_net) as dealer_net_amount,
-                        SUM(tsi.total_net) as total_net_amount,
-                        COUNT(DISTINCT tsi.stock_id) as stock_count
-                    FROM tpex_stock_insti tsi
-                    LEFT JOIN (
-                        SELECT DISTINCT ON (stock_id)
-                            stock_id, industry_type, report_month
-                        FROM monthly_revenue
-                        ORDER BY stock_id, report_month DESC
-                    ) mr ON tsi.stock_id = mr.stock_id
-                    WHERE tsi.trade_date = CASE 
-                        WHEN $1::date IS NOT NULL THEN $1::date 
-                        ELSE (SELECT MAX(trade_date) FROM tpex_stock_insti) 
-                    END
-                    AND tsi.stock_id NOT LIKE '00%'
-                    GROUP BY COALESCE(mr.industry_type, '未分類')
-                )
-                SELECT 
-                    industry_type,
-                    market,
-                    foreign_net_amount,
-                    investment_trust_net_amount,
-                    dealer_net_amount,
-                    total_net_amount,
-                    stock_count,
-                    ROW_NUMBER() OVER (ORDER BY ABS(total_net_amount) DESC) as rank_in_market
-                FROM industry_trading
-                ORDER BY ABS(total_net_amount) DESC
-            """
-            
-            # 處理日期參數
-            date_param = None
-            if date:
-                try:
-                    from datetime import datetime
-                    date_param = datetime.strptime(date, '%Y-%m-%d').date()
-                except ValueError:
-                    raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
-            
-            # 執行查詢
-            tse_data = await conn.fetch(tse_query, date_param)
-            tpex_data = await conn.fetch(tpex_query, date_param)
-            
-            # 轉換結果
-            tse_result = [dict(row) for row in tse_data]
-            tpex_result = [dict(row) for row in tpex_data]
-            
-            return {
+            response = {
                 "success": True,
-                "message": "獲取三大法人買賣超產業成功",
-                "data": {
-                    "tse": tse_result,
-                    "tpex": tpex_result
-                }
+                "message": "獲取產業買賣超趨勢成功",
+                "data": rows,
+                "start": min(row["trade_date"] for row in rows).strftime('%Y-%m-%d') if rows else None,
+                "end": max(row["trade_date"] for row in rows).strftime('%Y-%m-%d') if rows else None,
+                "window": window
             }
+            return with_headers(format_rows_response(response, format.value), headers)
             
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"獲取三大法人買賣超產業失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"獲取產業買賣超趨勢失敗: {str(e)}")
 
 @postgres_router.get("/institutional-trading/industry-details/{market}/{industry_type}")
-async def get_industry_trading_details(market: str, industry_type: str, date: Optional[str] = Query(None, description="查詢日期 (YYYY-MM-DD)")):
+async def get_industry_trading_details(
+    request: Request,
+    market: str,
+    industry_type: str,
+    date: Optional[str] = Query(None, description="查詢日期 (YYYY-MM-DD)"),
+    format: ResponseFormat = Query(ResponseFormat.JSON, description="回應格式: json / columnar / arrow")
+):
     """獲取特定產業的詳細買賣超標的內容"""
     try:
+        # 處理日期參數
+        date_param = _parse_date_param(date)
+        
+        # 確保產業對照索引為最新
+        await ensure_industry_index()
+
+        # 根據市場選擇對應的表與查詢語句
+        market = market.upper()
+        if market == "TSE":
+            table_name, statement = "twse_stock_insti", TSE_INDUSTRY_DETAILS
+        elif market == "TPEX":
+            table_name, statement = "tpex_stock_insti", TPEX_INDUSTRY_DETAILS
+        else:
+            raise HTTPException(status_code=400, detail="市場參數錯誤，請使用 TSE 或 TPEX")
+        
+        # 資料未更新時直接回應 304
+        not_modified, headers = await check_not_modified(
+            request, "industry-details", (market, industry_type, date_param, format.value), (table_name,)
+        )
+        if not_modified is not None:
+            return not_modified
+        
+        # 以解析後的交易日期查詢快取
+        cached, cache_key = await analytics_cache.lookup(
+            "industry-details", (market, industry_type), date_param, (table_name,)
+        )
+        if cached is not None:
+            return with_headers(format_rows_response(cached, format.value), headers)
+        
         conn = await get_connection()
         try:
-            # 根據市場選擇對應的表
-            table_name = "twse_stock_insti" if market.upper() == "TSE" else "tpex_stock_insti"
-            
-            # 根據市場選擇不同的欄位名稱
-            if market.upper() == "TSE":
-                query = f"""
-                    SELECT 
-                        tsi.stock_id,
-                        tsi.stock_name,
-                        tsi.foreign_excl_dealer_net + tsi.foreign_dealer_net as foreign_net_amount,
-                        tsi.investment_trust_net as investment_trust_net_amount,
-                        tsi.dealer_self_net + tsi.dealer_hedge_net as dealer_net_amount,
-                        tsi.total_net as total_net_amount,
-                        tsi.trade_date
-                    FROM {table_name} tsi
-                    LEFT JOIN (
-                        SELECT DISTINCT ON (stock_id)
-                            stock_id, industry_type, report_month
-                        FROM monthly_revenue
-                        ORDER BY stock_id, report_month DESC
-                    ) mr ON tsi.stock_id = mr.stock_id
-                    WHERE tsi.trade_date = CASE 
-                        WHEN $2::date IS NOT NULL THEN $2::date 
-                        ELSE (SELECT MAX(trade_date) FROM {table_name}) 
-                    END
-                    AND COALESCE(mr.industry_type, '未分類') = $1
-                    AND tsi.stock_id NOT LIKE '00%'
-                    ORDER BY ABS(tsi.total_net) DESC
-                """
-            else:  # TPEX
-                query = f"""
-                    SELECT 
-                        tsi.stock_id,
-                        tsi.stock_name,
-                        tsi.foreign_net as foreign_net_amount,
-                        tsi.investment_trust_net as investment_trust_net_amount,
-                        tsi.dealer_net as dealer_net_amount,
-                        tsi.total_net as total_net_amount,
-                        tsi.trade_date
-                    FROM {table_name} tsi
-                    LEFT JOIN (
-                        SELECT DISTINCT ON (stock_id)
-                            stock_id, industry_type, report_month
-                        FROM monthly_revenue
-                        ORDER BY stock_id, report_month DESC
-                    ) mr ON tsi.stock_id = mr.stock_id
-                    WHERE tsi.trade_date = CASE 
-                        WHEN $2::date IS NOT NULL THEN $2::date 
-                        ELSE (SELECT MAX(trade_date) FROM {table_name}) 
-                    END
-                    AND COALESCE(mr.industry_type, '未分類') = $1
-                    AND tsi.stock_id NOT LIKE '00%'
-                    ORDER BY ABS(tsi.total_net) DESC
-                """
-            
-            # 處理日期參數
-            date_param = None
-            if date:
-                try:
-                    from datetime import datetime
-                    date_param = datetime.strptime(date, '%Y-%m-%d').date()
-                except ValueError:
-                    raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
-            
-            rows = await conn.fetch(query, industry_type, date_param)
-            
-            # 轉換結果
-            data = [dict(row) for row in rows]
+            rows = await run_statement(conn, statement, industry_type, date_param)
             
-            return {
+            response = {
                 "success": True,
                 "message": f"獲取{industry_type}產業詳細買賣超成功",
-                "data": data,
+                "data": rows,
                 "industry_type": industry_type,
                 "market": market
             }
+            analytics_cache.store(cache_key, response)
+            return with_headers(format_rows_response(response, format.value), headers)
             
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取產業詳細買賣超失敗: {str(e)}")
 
 @postgres_router.get("/industry-analysis")
-async def get_industry_analysis(date: Optional[str] = Query(None, description="查詢日期 (YYYY-MM-DD)")):
+async def get_industry_analysis(
+    request: Request,
+    date: Optional[str] = Query(None, description="查詢日期 (YYYY-MM-DD)"),
+    format: ResponseFormat = Query(ResponseFormat.JSON, description="回應格式: json / columnar / arrow")
+):
     """獲取產業分析數據"""
     try:
+        # 處理日期參數
+        date_param = _parse_date_param(date)
+        
+        # 確保產業對照索引為最新
+        await ensure_industry_index()
+        
+        # 資料未更新時直接回應 304
+        not_modified, headers = await check_not_modified(
+            request, "industry-analysis", (date_param, format.value), ("tw_stock_price",)
+        )
+        if not_modified is not None:
+            return not_modified
+        
+        # 以解析後的交易日期查詢快取
+        cached, cache_key = await analytics_cache.lookup("industry-analysis", (), date_param, ("tw_stock_price",))
+        if cached is not None:
+            return with_headers(format_rows_response(cached, format.value), headers)
+        
+        # 彙總表不可用或落後最新交易日時改查原始資料表
+        statement = ROLLUP_INDUSTRY_ANALYSIS if await ensure_industry_rollups(("tw_stock_price",)) else INDUSTRY_ANALYSIS
+        
         conn = await get_connection()
         try:
-            query = """
-                SELECT 
-                  COALESCE(mr.industry_type, '未分類') as industry_type,
-                  COALESCE(sp.market, '未分類') as market,
-                  COUNT(DISTINCT sp.stock_id) as stock_count,
-                  CASE 
-                    WHEN SUM(sp.open) > 0 
-                    THEN ROUND(((SUM(sp.close) - SUM(sp.open)) / SUM(sp.open)) * 100, 2)
-                    ELSE 0 
-                  END as avg_change_percent,
-                  COALESCE(SUM(sp.amount) * 10000, 0) as total_volume
-                FROM tw_stock_price sp
-                LEFT JOIN (
-                  SELECT DISTINCT ON (stock_id)
-                      stock_id, industry_type, report_month
-                  FROM monthly_revenue
-                  ORDER BY stock_id, report_month DESC
-                ) mr ON sp.stock_id = mr.stock_id
-                WHERE sp.trade_date = CASE 
-                    WHEN $1::date IS NOT NULL THEN $1::date 
-                    ELSE (SELECT MAX(trade_date) FROM tw_stock_price) 
-                END
-                AND sp.stock_id NOT LIKE '00%'
-                GROUP BY COALESCE(mr.industry_type, '未分類'), COALESCE(sp.market, '未分類')
-                ORDER BY total_volume DESC
-            """
-            
-            # 處理日期參數
-            date_param = None
-            if date:
-                try:
-                    from datetime import datetime
-                    date_param = datetime.strptime(date, '%Y-%m-%d').date()
-                except ValueError:
-                    raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
-            
-            rows = await conn.fetch(query, date_param)
+            rows = await run_statement(conn, statement, date_param)
             
             # 轉換結果
             data = []
@@ -632,94 +1034,104 @@ async def get_industry_analysis(date: Optional[str] = Query(None, description="
                     'total_volume': float(row['total_volume']) if row['total_volume'] else 0
                 })
             
-            return {
+            response = {
                 "success": True,
                 "message": "獲取產業分析數據成功",
                 "data": data
             }
+            analytics_cache.store(cache_key, response)
+            return with_headers(format_rows_response(response, format.value), headers)
             
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取產業分析數據失敗: {str(e)}")
 
 @postgres_router.get("/stock-list")
-async def get_stock_list():
-    """獲取股票清單"""
+async def get_stock_list(request: Request):
+    """獲取股票清單，直接返回記憶體中搜尋索引的股票資料"""
     try:
-        conn = await get_connection()
-        try:
-            query = """
-                SELECT DISTINCT 
-                  sp.stock_id, 
-                  sp.stock_name, 
-                  sp.market,
-                  mr.industry_type
-                FROM tw_stock_price sp
-                LEFT JOIN (
-                    SELECT DISTINCT ON (stock_id)
-                        stock_id, industry_type, report_month
-                    FROM monthly_revenue
-                    ORDER BY stock_id, report_month DESC
-                ) mr ON sp.stock_id = mr.stock_id
-                WHERE sp.stock_id NOT LIKE '00%'
-                ORDER BY sp.stock_id
-            """
-            
-            rows = await conn.fetch(query)
-            
-            # 轉換結果
-            data = []
-            for row in rows:
-                # 標準化市場名稱：OTC -> TPEX
-                market = 'TPEX' if row['market'] == 'OTC' else row['market']
-                data.append({
-                    'stock_id': row['stock_id'],
-                    'stock_name': row['stock_name'],
-                    'market': market,
-                    'industry_type': row['industry_type']
-                })
-            
-            return {
-                "success": True,
-                "message": "獲取股票清單成功",
-                "data": data
-            }
-            
-        finally:
-            await close_connection(conn)
+        # 確保產業對照索引為最新
+        await ensure_industry_index()
+
+        # 資料未更新時直接回應 304
+        not_modified, headers = await check_not_modified(request, "stock-list", (), ("tw_stock_price",))
+        if not_modified is not None:
+            return not_modified
+
+        index = await get_stock_search_index()
+        
+        return with_headers(FastJSONResponse({
+            "success": True,
+            "message": "獲取股票清單成功",
+            "data": index.rows
+        }), headers)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取股票清單失敗: {str(e)}")
 
+@postgres_router.get("/stock-search")
+async def search_stocks(
+    q: str = Query(..., min_length=1, description="股票代號或名稱關鍵字"),
+    limit: int = Query(10, ge=1, le=100, description="返回筆數"),
+    market: Optional[str] = Query(None, description="市場篩選: TSE / TPEX"),
+    industry_type: Optional[str] = Query(None, description="產業篩選"),
+    facets: bool = Query(False, description="是否返回市場與產業的分布統計")
+):
+    """以記憶體索引搜尋股票，依代號完全相符、代號前綴、名稱前綴、名稱包含排序"""
+    try:
+        index = await get_stock_search_index()
+        
+        start_time = time.perf_counter()
+        results, facet_counts = index.search(q, limit=limit, market=market, industry_type=industry_type, facets=facets)
+        search_time = time.perf_counter() - start_time
+        
+        response = {
+            "success": True,
+            "message": f"搜尋到 {len(results)} 檔股票",
+            "data": results,
+            "query": q,
+            "search_time": search_time
+        }
+        if facet_counts is not None:
+            response["facets"] = facet_counts
+        return FastJSONResponse(response)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜尋股票失敗: {str(e)}")
+
 @postgres_router.get("/latest-trade-date")
-async def get_latest_trade_date():
+async def get_latest_trade_date(request: Request):
     """獲取最新的交易日期"""
     try:
+        # 資料未更新時直接回應 304，不需取得連接
+        not_modified, headers = await check_not_modified(
+            request, "latest-trade-date", (), ("tw_stock_price", "twse_stock_insti", "tpex_stock_insti"),
+            use_industry_map=False
+        )
+        if not_modified is not None:
+            return not_modified
+        
         conn = await get_connection()
         try:
             # 查詢最新的交易日期（從多個表中選擇最新的）
-            query = """
-                SELECT MAX(latest_date) as latest_trade_date FROM (
-                    SELECT MAX(trade_date) as latest_date FROM tw_stock_price
-                    UNION ALL
-                    SELECT MAX(trade_date) as latest_date FROM twse_stock_insti
-                    UNION ALL
-                    SELECT MAX(trade_date) as latest_date FROM tpex_stock_insti
-                ) dates
-            """
-            
-            result = await conn.fetchval(query)
+            result = await run_statement(conn, LATEST_TRADE_DATE, method="fetchval")
             
             if result:
-                return {
+                return FastJSONResponse({
                     "success": True,
                     "message": "獲取最新交易日期成功",
                     "data": {
                         "latest_trade_date": result.strftime('%Y-%m-%d')
                     }
-                }
+                }, headers=headers)
             else:
                 return {
                     "success": False,
@@ -730,36 +1142,172 @@ async def get_latest_trade_date():
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取最新交易日期失敗: {str(e)}")
 
 @postgres_router.get("/stock-chart/{stock_id}")
-async def get_stock_chart_data(stock_id: str):
+async def get_stock_chart_data(
+    stock_id: str,
+    start: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
+    before: Optional[str] = Query(None, description="分頁游標，只返回早於此日期的K棒 (YYYY-MM-DD)"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="最多返回的K棒數量"),
+    interval: str = Query("day", pattern="^(day|week|month)$", description="K線週期: day / week / month"),
+    points: Optional[int] = Query(None, ge=3, le=10000, description="LTTB 降採樣目標點數"),
+    format: ResponseFormat = Query(ResponseFormat.JSON, description="回應格式: json / columnar / arrow")
+):
     """獲取股票K線圖數據"""
     try:
+        start_date = _parse_date_param(start)
+        end_date = _parse_date_param(end)
+        before_date = _parse_date_param(before)
+
         conn = await get_connection()
         try:
-            query = """
-                SELECT trade_date, open, close, high, low, shares 
-                FROM tw_stock_price 
-                WHERE stock_id = $1 
-                ORDER BY trade_date DESC
-            """
-            
-            rows = await conn.fetch(query, stock_id)
+            # 日K 直接取原始數據，週K / 月K 在資料庫端彙總
+            trunc_unit = CHART_INTERVALS[interval]
+            if trunc_unit is None:
+                rows = await run_statement(conn, DAILY_CHART_QUERY, stock_id, start_date, end_date, before_date, limit)
+            else:
+                rows = await run_statement(conn, RESAMPLED_CHART_QUERY, stock_id, start_date, end_date, before_date, limit, trunc_unit)
             
-            # 轉換結果
-            data = [dict(row) for row in rows]
+            data = list(rows)
+
+            # 取滿 limit 時，以最舊一筆的日期作為下一頁游標
+            next_before = None
+            if limit is not None and len(data) == limit:
+                next_before = data[-1]['trade_date'].strftime('%Y-%m-%d')
+
+            # 依目標點數降採樣
+            if points is not None:
+                data = downsample_ohlcv(data, points)
             
-            return {
+            return format_rows_response({
                 "success": True,
                 "message": f"獲取股票 {stock_id} K線數據成功",
                 "data": data,
-                "stock_id": stock_id
+                "stock_id": stock_id,
+                "interval": interval,
+                "next_before": next_before
+            }, format.value)
+            
+        finally:
+            await close_connection(conn)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"獲取股票K線數據失敗: {str(e)}")
+
+@postgres_router.get("/stock-charts")
+async def get_stock_charts_batch(
+    stock_ids: str = Query(..., description="逗號分隔的股票代號，例如 2330,2317"),
+    start: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="每檔股票最多返回的K棒數量"),
+    interval: str = Query("day", pattern="^(day|week|month)$", description="K線週期: day / week / month"),
+    format: ResponseFormat = Query(ResponseFormat.JSON, description="回應格式: json / columnar / arrow")
+):
+    """以單一查詢獲取多檔股票的K線數據，依股票代號分組返回"""
+    ids = parse_stock_ids(stock_ids)
+    if not ids:
+        raise HTTPException(status_code=400, detail="請提供至少一個股票代號")
+    if len(ids) > CHART_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"單次最多查詢 {CHART_BATCH_MAX_IDS} 檔股票")
+    
+    try:
+        start_date = _parse_date_param(start)
+        end_date = _parse_date_param(end)
+
+        conn = await get_connection()
+        try:
+            trunc_unit = CHART_INTERVALS[interval]
+            if trunc_unit is None:
+                rows = await run_statement(conn, BATCH_DAILY_CHART_QUERY, ids, start_date, end_date, limit)
+            else:
+                rows = await run_statement(conn, BATCH_RESAMPLED_CHART_QUERY, ids, start_date, end_date, limit, trunc_unit)
+            
+            data = group_by_stock(rows, ids)
+            missing = [stock_id for stock_id, series in data.items() if not series]
+            
+            response = {
+                "success": True,
+                "message": f"獲取 {len(ids) - len(missing)} 檔股票K線數據成功",
+                "data": data,
+                "interval": interval,
+                "missing": missing
             }
+            return _format_grouped_response(response, format, "stock_id")
             
         finally:
             await close_connection(conn)
             
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"獲取股票K線數據失敗: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"獲取多檔股票K線數據失敗: {str(e)}")
+
+@postgres_router.get("/stock-chart/{stock_id}/indicators")
+async def get_stock_indicators(
+    stock_id: str,
+    start: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)")
+):
+    """獲取股票技術指標（均線、EMA、RSI、MACD、布林帶、成交量均線）"""
+    try:
+        start_date = _parse_date_param(start)
+        end_date = _parse_date_param(end)
+
+        conn = await get_connection()
+        try:
+            # 以最新交易日期判斷快取是否有效
+            last_trade_date = await run_statement(conn, LAST_TRADE_DATE_QUERY, stock_id, method="fetchval")
+            if last_trade_date is None:
+                raise HTTPException(status_code=404, detail=f"股票 {stock_id} 沒有K線數據")
+
+            result = get_cached_indicators(stock_id, last_trade_date)
+            cached = result is not None
+            if not cached:
+                rows = await run_statement(conn, INDICATOR_SERIES_QUERY, stock_id)
+                result = compute_indicators(rows)
+                set_cached_indicators(stock_id, last_trade_date, result)
+
+            return FastJSONResponse({
+                "success": True,
+                "message": f"獲取股票 {stock_id} 技術指標成功",
+                "data": slice_indicators(result, start_date, end_date),
+                "stock_id": stock_id,
+                "last_trade_date": last_trade_date.strftime('%Y-%m-%d'),
+                "cached": cached
+            })
+
+        finally:
+            await close_connection(conn)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"獲取股票技術指標失敗: {str(e)}")
+
+@postgres_router.get("/cache/stats")
+async def get_cache_stats():
+    """獲取產業分析回應快取與自定義查詢結果快取的命中統計"""
+    return {
+        "success": True,
+        "message": "獲取快取統計成功",
+        "data": {
+            "analytics": analytics_cache.stats(),
+            "query": query_cache.stats()
+        }
+    }
+
+@postgres_router.get("/statements/stats")
+async def get_statements_stats():
+    """獲取具名 SQL 語句的執行次數與耗時統計"""
+    return {
+        "success": True,
+        "message": "獲取語句統計成功",
+        "data": get_statement_stats()
+    }
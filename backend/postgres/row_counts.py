@@ -0,0 +1,87 @@
+"""
+資料表行數統計模組
+預設從系統目錄讀取估計值，精確計數需明確指定並分散到多個連接並行執行
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from .cache import TTLCache
+from .connection import acquire_connection
+from .utils import quote_ident
+
+load_dotenv()
+
+# 行數快取存活秒數與精確計數的並行連接數
+ROW_COUNT_CACHE_TTL = float(os.getenv("POSTGRES_ROW_COUNT_CACHE_TTL", "60"))
+EXACT_COUNT_CONCURRENCY = int(os.getenv("POSTGRES_EXACT_COUNT_CONCURRENCY", "4"))
+
+# 單次目錄查詢取得 public schema 所有資料表的估計行數
+# reltuples 在從未 ANALYZE 的資料表上為 -1，此時改用 pg_stat_user_tables 的 n_live_tup
+ESTIMATED_ROW_COUNTS_QUERY = """
+    SELECT
+        c.relname as table_name,
+        CASE
+            WHEN c.reltuples >= 0 THEN c.reltuples::bigint
+            ELSE s.n_live_tup
+        END as row_count
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = 'public'
+    AND c.relkind IN ('r', 'p')
+"""
+
+_row_count_cache = TTLCache(ttl=ROW_COUNT_CACHE_TTL)
+
+async def _get_estimated_row_counts() -> Dict[str, Optional[int]]:
+    """讀取所有資料表的估計行數，快取未命中時才取得連接"""
+    counts = _row_count_cache.get("estimate")
+    if counts is None:
+        async with acquire_connection() as conn:
+            rows = await conn.fetch(ESTIMATED_ROW_COUNTS_QUERY)
+        counts = {row['table_name']: row['row_count'] for row in rows}
+        _row_count_cache.set("estimate", counts)
+    return counts
+
+async def _get_exact_row_counts(table_names: List[str]) -> Dict[str, Optional[int]]:
+    """以多個連接並行執行 COUNT(*)，失敗的資料表返回 None"""
+    counts: Dict[str, Optional[int]] = {}
+    missing = []
+    for table_name in table_names:
+        cached = _row_count_cache.get(("exact", table_name))
+        if cached is None:
+            missing.append(table_name)
+        else:
+            counts[table_name] = cached
+
+    if missing:
+        semaphore = asyncio.Semaphore(EXACT_COUNT_CONCURRENCY)
+
+        async def _count(table_name: str) -> Optional[int]:
+            async with semaphore:
+                try:
+                    async with acquire_connection() as conn:
+                        return await conn.fetchval(f"SELECT COUNT(*) FROM public.{quote_ident(table_name)}")
+                except Exception:
+                    return None
+
+        results = await asyncio.gather(*(_count(name) for name in missing))
+        for table_name, row_count in zip(missing, results):
+            counts[table_name] = row_count
+            if row_count is not None:
+                _row_count_cache.set(("exact", table_name), row_count)
+
+    return counts
+
+async def get_row_counts(table_names: List[str], exact: bool = False) -> Dict[str, Optional[int]]:
+    """
+    獲取資料表行數
+    exact 為 False 時使用系統目錄估計值，為 True 時執行精確的 COUNT(*)
+    自行取得所需的連接，呼叫端不應在等待期間持有其他連接
+    """
+    if exact:
+        return await _get_exact_row_counts(table_names)
+    return await _get_estimated_row_counts()
@@ -0,0 +1,164 @@
+"""
+股票搜尋索引模組
+將股票清單載入記憶體，以股票代號前綴與股票名稱的所有子字串（中文逐字）建立倒排索引，
+每次按鍵只需字典查詢與掃描前 k 筆，與資料表大小無關；
+tw_stock_price 出現新交易日或產業對照前進時重新建立索引，以納入新上市股票
+"""
+
+import asyncio
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from .analytics_cache import get_latest_trade_dates
+from .connection import acquire_connection
+from .industry import ensure_industry_index, get_industry_map_version
+from .queries import STOCK_LIST
+from .statements import run_statement
+
+# 股票名稱建立子字串索引的最大長度，超過的查詢以此長度的索引篩選後再比對
+MAX_NGRAM = 8
+
+def normalize(text: Optional[str]) -> str:
+    """全形轉半形、去除空白並轉小寫"""
+    if not text:
+        return ""
+    return unicodedata.normalize("NFKC", text).replace(" ", "").lower()
+
+class StockSearchIndex:
+    """股票代號前綴 / 名稱子字串倒排索引"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        # 原始順序的股票清單，供 /stock-list 直接返回
+        self.rows = rows
+        # 依股票代號長度與代號排序，索引中的每個列表都維持此順序，較短、較小的代號排在前面
+        self.entries = sorted(rows, key=lambda row: (len(row["stock_id"]), row["stock_id"]))
+        self._id_exact: Dict[str, List[int]] = {}
+        self._id_prefix: Dict[str, List[int]] = {}
+        self._name_prefix: Dict[str, List[int]] = {}
+        self._name_ngram: Dict[str, List[int]] = {}
+
+        for position, row in enumerate(self.entries):
+            stock_id = normalize(row["stock_id"])
+            name = normalize(row["stock_name"])
+            self._id_exact.setdefault(stock_id, []).append(position)
+            for end in range(1, len(stock_id) + 1):
+                self._id_prefix.setdefault(stock_id[:end], []).append(position)
+            for end in range(1, len(name) + 1):
+                self._name_prefix.setdefault(name[:end], []).append(position)
+            grams = {
+                name[start:start + size]
+                for size in range(1, min(MAX_NGRAM, len(name)) + 1)
+                for start in range(len(name) - size + 1)
+            }
+            for gram in grams:
+                self._name_ngram.setdefault(gram, []).append(position)
+
+    def _tiers(self, q: str):
+        """依排名由高到低：代號完全相符、代號前綴、名稱前綴、名稱包含"""
+        yield self._id_exact.get(q, [])
+        yield self._id_prefix.get(q, [])
+        yield self._name_prefix.get(q[:MAX_NGRAM], [])
+        yield self._name_ngram.get(q[:MAX_NGRAM], [])
+
+    def _matches(self, position: int, q: str, market: Optional[str], industry_type: Optional[str]) -> bool:
+        row = self.entries[position]
+        if market is not None and row["market"] != market:
+            return False
+        if industry_type is not None and row["industry_type"] != industry_type:
+            return False
+        # 查詢長於索引長度時，以完整字串再確認
+        if len(q) > MAX_NGRAM:
+            return q in normalize(row["stock_name"]) or normalize(row["stock_id"]).startswith(q)
+        return True
+
+    def search(
+        self,
+        q: str,
+        limit: int = 10,
+        market: Optional[str] = None,
+        industry_type: Optional[str] = None,
+        facets: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Dict[str, int]]]]:
+        """
+        返回排名前 limit 筆結果
+        facets 為 True 時另外統計所有符合查詢的股票在市場與產業上的分布
+        """
+        q = normalize(q)
+        if not q:
+            return [], None
+
+        results = []
+        seen = set()
+        for tier in self._tiers(q):
+            for position in tier:
+                if position in seen:
+                    continue
+                seen.add(position)
+                if self._matches(position, q, market, industry_type):
+                    results.append(self.entries[position])
+                    if len(results) >= limit:
+                        break
+            if len(results) >= limit:
+                break
+
+        facet_counts = None
+        if facets:
+            positions = set()
+            for tier in self._tiers(q):
+                positions.update(tier)
+            facet_counts = {"market": {}, "industry_type": {}}
+            for position in positions:
+                if not self._matches(position, q, None, None):
+                    continue
+                row = self.entries[position]
+                for name in ("market", "industry_type"):
+                    value = row[name] or ""
+                    facet_counts[name][value] = facet_counts[name].get(value, 0) + 1
+
+        return results, facet_counts
+
+# 全局索引與其對應的 (最新交易日期, 產業對照版本)
+_index: Optional[StockSearchIndex] = None
+_signature: Optional[Tuple] = None
+_lock = asyncio.Lock()
+
+async def _load_rows() -> List[Dict[str, Any]]:
+    """讀取股票清單，市場名稱 OTC 標準化為 TPEX"""
+    async with acquire_connection() as conn:
+        rows = await run_statement(conn, STOCK_LIST)
+    return [
+        {
+            "stock_id": row["stock_id"],
+            "stock_name": row["stock_name"],
+            "market": "TPEX" if row["market"] == "OTC" else row["market"],
+            "industry_type": row["industry_type"],
+        }
+        for row in rows
+    ]
+
+async def get_stock_search_index() -> StockSearchIndex:
+    """
+    返回最新的搜尋索引
+    最新交易日期與產業對照的檢查皆有短暫快取，未變動時不需存取資料庫
+    """
+    global _index, _signature
+
+    await ensure_industry_index()
+    latest = await get_latest_trade_dates()
+    signature = (latest["tw_stock_price"], get_industry_map_version())
+    if _index is not None and signature == _signature:
+        return _index
+
+    async with _lock:
+        if _index is None or signature != _signature:
+            _index = StockSearchIndex(await _load_rows())
+            _signature = signature
+            print(f"✅ 股票搜尋索引已建立，共 {len(_index.entries)} 檔股票")
+    return _index
+
+async def init_stock_search_index():
+    """應用啟動時建立股票搜尋索引"""
+    try:
+        await get_stock_search_index()
+    except Exception as e:
+        print(f"❌ 股票搜尋索引建立失敗: {e}")
@@ -0,0 +1,144 @@
+"""
+具名 SQL 語句註冊表
+固定的分析查詢在此以名稱註冊，連接池建立連接時逐一放入該連接的 asyncpg 語句快取，
+執行時以相同的 SQL 文字命中快取，不再重新解析與規劃，並記錄每個語句的執行次數與耗時。
+不保存 PreparedStatement 物件：連接歸還連接池後 asyncpg 會使其失效，而語句快取隨連接保留
+"""
+
+import time
+from typing import Any, Dict, List
+
+from .metrics import DB_STATEMENT_DURATION, DB_STATEMENT_ERRORS, DB_STATEMENT_ROWS
+
+# 名稱 -> SQL
+_statements: Dict[str, str] = {}
+
+# 名稱 -> 統計數據
+_stats: Dict[str, Dict[str, Any]] = {}
+
+def _empty_stats() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "rows": 0,
+        "total_exec_time": 0.0,
+        "max_exec_time": 0.0,
+        "prepared": 0,
+        "prepare_errors": 0,
+        "total_prepare_time": 0.0,
+    }
+
+def register_statement(name: str, query: str) -> str:
+    """註冊具名語句，返回名稱供呼叫端使用"""
+    if name in _statements and _statements[name] != query:
+        raise ValueError(f"語句名稱 {name} 已被註冊")
+    _statements[name] = query
+    _stats.setdefault(name, _empty_stats())
+    return name
+
+def get_statement(name: str) -> str:
+    """取得具名語句的 SQL"""
+    return _statements[name]
+
+def list_statements() -> List[str]:
+    """返回所有已註冊的語句名稱"""
+    return list(_statements.keys())
+
+async def _prepare(conn, name: str):
+    """
+    將具名語句放入連接的語句快取並記錄準備耗時
+    asyncpg 沒有公開的快取預熱介面，使用與 fetch 相同的 _get_statement 以相同快取鍵寫入
+    """
+    stats = _stats[name]
+    start_time = time.perf_counter()
+    try:
+        await conn._get_statement(_statements[name], None)
+    except Exception:
+        stats["prepare_errors"] += 1
+        raise
+    finally:
+        stats["total_prepare_time"] += time.perf_counter() - start_time
+    stats["prepared"] += 1
+
+async def prepare_registered_statements(conn):
+    """
+    在新建立的連接上預先準備所有已註冊語句
+    單一語句準備失敗（例如依賴的資料表尚未建立）只記錄不拋出，避免連接建立失敗，首次執行時再準備
+    """
+    for name in _statements:
+        try:
+            await _prepare(conn, name)
+        except Exception as e:
+            print(f"❌ 預先準備語句 {name} 失敗: {e}")
+
+async def run_statement(conn, name: str, *args, method: str = "fetch", timeout=None):
+    """
+    以連接語句快取中已準備的語句執行具名語句並記錄耗時
+    method 可為 fetch、fetchrow 或 fetchval
+    """
+    stats = _stats[name]
+    start_time = time.perf_counter()
+    try:
+        # 經由語句快取執行；結構變動使快取語句失效時 asyncpg 會在交易外自動重新準備並重試
+        result = await getattr(conn, method)(_statements[name], *args, timeout=timeout)
+    except Exception:
+        stats["errors"] += 1
+        DB_STATEMENT_ERRORS.inc((name,))
+        raise
+    finally:
+        elapsed = time.perf_counter() - start_time
+        stats["calls"] += 1
+        stats["total_exec_time"] += elapsed
+        stats["max_exec_time"] = max(stats["max_exec_time"], elapsed)
+        DB_STATEMENT_DURATION.observe((name,), elapsed)
+
+    if method == "fetch":
+        rows = len(result)
+    else:
+        rows = 1 if method == "fetchrow" and result is not None else 0
+    stats["rows"] += rows
+    if method == "fetch":
+        DB_STATEMENT_ROWS.observe((name,), rows)
+    return result
+
+async def open_statement_cursor(conn, name: str, *args, timeout=None):
+    """
+    在目前交易中以具名語句開啟伺服器端游標，返回 (欄位屬性, 游標)
+    記錄呼叫次數與開啟游標的耗時；行數由呼叫端逐批讀取，不列入統計
+    """
+    stats = _stats[name]
+    start_time = time.perf_counter()
+    try:
+        statement = await conn.prepare(_statements[name], timeout=timeout)
+        cursor = await statement.cursor(*args, timeout=timeout)
+    except Exception:
+        stats["errors"] += 1
+        DB_STATEMENT_ERRORS.inc((name,))
+        raise
+    finally:
+        elapsed = time.perf_counter() - start_time
+        stats["calls"] += 1
+        stats["total_exec_time"] += elapsed
+        stats["max_exec_time"] = max(stats["max_exec_time"], elapsed)
+        DB_STATEMENT_DURATION.observe((name,), elapsed)
+    return statement.get_attributes(), cursor
+
+def get_statement_stats() -> List[Dict[str, Any]]:
+    """返回每個語句的統計，依總執行時間由高到低排序"""
+    result = []
+    for name, stats in _stats.items():
+        calls = stats["calls"]
+        result.append({
+            "name": name,
+            "calls": calls,
+            "errors": stats["errors"],
+            "rows": stats["rows"],
+            "total_exec_ms": round(stats["total_exec_time"] * 1000, 3),
+            "avg_exec_ms": round(stats["total_exec_time"] * 1000 / calls, 3) if calls else 0.0,
+            "max_exec_ms": round(stats["max_exec_time"] * 1000, 3),
+            "prepared_connections": stats["prepared"],
+            "prepare_errors": stats["prepare_errors"],
+            "avg_prepare_ms": round(stats["total_prepare_time"] * 1000 / stats["prepared"], 3) if stats["prepared"] else 0.0,
+        })
+    result.sort(key=lambda item: item["total_exec_ms"], reverse=True)
+    return result
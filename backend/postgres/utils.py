@@ -0,0 +1,7 @@
+"""
+PostgreSQL 相關的共用工具函數
+"""
+
+def quote_ident(name: str) -> str:
+    """以雙引號包住識別字，避免與關鍵字衝突或被注入"""
+    return '"' + name.replace('"', '""') + '"'